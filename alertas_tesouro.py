@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import threading
+from collections import namedtuple, defaultdict
+import numpy as np
+
+from api_tesouro import tabela_titulos
+from envio_email import Destinatario, ResultadoEnvio, SessaoSMTP
+from cache_compartilhado import trava_recurso
+from metricas import contar, medir
+
+ALERTAS_FILE = os.path.normpath(os.path.join("dados", "alertas.json"))
+# Últimas taxas, alertas já notificados e e-mails pendentes, entre um ciclo e outro
+ESTADO_FILE = os.path.normpath(os.path.join("dados", "alertas_estado.json"))
+# Segundos em que o mesmo alerta não é repetido (evita e-mails a cada oscilação da taxa)
+INTERVALO_MINIMO = 30 * 60
+COLUNA_TAXA = "Rentabilidade (Compra)"
+# direcao: a taxa subiu até o limite, caiu até ele, ou qualquer cruzamento
+DIRECOES = {"acima": 1, "abaixo": -1, "ambos": 0}
+
+# Separa títulos diferentes na chave combinada (título, taxa); taxas são sempre menores que isso
+_ESCALA_CHAVE = 1000.0
+
+Alerta = namedtuple("Alerta", ["email", "titulo", "taxa", "direcao"], defaults=("ambos",))
+Disparo = namedtuple("Disparo", ["alerta", "taxa_anterior", "taxa_atual"])
+
+
+def _normalizar_titulo(titulo):
+    return " ".join(str(titulo).split()).lower()
+
+
+# Alertas de todos os usuários (lista vazia se o arquivo não existir)
+def carregar_alertas(caminho=ALERTAS_FILE):
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            return [Alerta(**item) for item in json.load(f)]
+    except (FileNotFoundError, ValueError):
+        return []
+
+
+def _gravar_json(dados, caminho):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+def salvar_alertas(alertas, caminho=ALERTAS_FILE):
+    with trava_recurso(caminho):
+        _gravar_json([a._asdict() for a in alertas], caminho)
+
+
+# Lê, altera e grava os alertas sob uma única trava, para que edições simultâneas
+# (várias sessões ou réplicas) não se sobrescrevam
+def atualizar_alertas(alterar, caminho=ALERTAS_FILE):
+    """
+    alterar: recebe a lista atual de Alerta e devolve a nova
+    Retorna a lista gravada.
+    """
+    with trava_recurso(caminho):
+        alertas = list(alterar(carregar_alertas(caminho)))
+        salvar_alertas(alertas, caminho)
+    return alertas
+
+
+# Limites de todos os usuários ordenados por título e taxa; a cada snapshot só os
+# títulos cuja taxa mudou são avaliados, com uma busca binária por título
+class MotorAlertas:
+    """
+    intervalo_minimo: segundos em que o mesmo alerta não é disparado de novo
+    Um alerta dispara quando a taxa passa pelo limite entre dois snapshots:
+    subindo (anterior < limite <= atual) ou caindo (atual <= limite < anterior).
+    Os disparos ficam pendentes até despachar(), que manda um e-mail por usuário.
+    """
+
+    def __init__(self, alertas=(), intervalo_minimo=INTERVALO_MINIMO):
+        self.intervalo_minimo = intervalo_minimo
+        self._lock = threading.Lock()
+        self._ultimas_taxas = {}
+        self._notificado_em = {}
+        self._pendentes = defaultdict(list)
+        self.definir_alertas(alertas)
+
+    # Refaz o índice (ex.: quando um usuário cria ou remove um alerta)
+    def definir_alertas(self, alertas):
+        alertas = [a for a in alertas if a.direcao in DIRECOES]
+        codigos = {}
+        for alerta in alertas:
+            codigos.setdefault(_normalizar_titulo(alerta.titulo), len(codigos))
+        codigo = np.array([codigos[_normalizar_titulo(a.titulo)] for a in alertas], dtype="float64")
+        taxa = np.array([a.taxa for a in alertas], dtype="float64")
+        chave = codigo * _ESCALA_CHAVE + taxa
+        ordem = np.argsort(chave, kind="stable")
+        with self._lock:
+            self._codigos = codigos
+            self._alertas = [alertas[i] for i in ordem]
+            self._chave = chave[ordem]
+            self._direcao = np.array([DIRECOES[a.direcao] for a in self._alertas], dtype="int8")
+
+    # Avalia as taxas de um snapshot ({título: taxa}); retorna os disparos novos
+    def processar(self, taxas, agora=None):
+        """
+        Títulos vistos pela primeira vez só registram a taxa (não há cruzamento).
+        """
+        agora = time.time() if agora is None else agora
+        with self._lock, medir("alertas:processar"):
+            mudaram = []
+            for titulo, taxa in taxas.items():
+                nome = _normalizar_titulo(titulo)
+                anterior = self._ultimas_taxas.get(nome)
+                self._ultimas_taxas[nome] = taxa
+                if anterior is not None and taxa != anterior and nome in self._codigos and not np.isnan(taxa):
+                    mudaram.append((self._codigos[nome], anterior, taxa))
+            contar("alertas_titulos_avaliados", len(mudaram))
+            if not mudaram:
+                return []
+
+            codigo, anterior, atual = (np.array(c, dtype="float64") for c in zip(*mudaram))
+            subiu = atual > anterior
+            menor = codigo * _ESCALA_CHAVE + np.minimum(anterior, atual)
+            maior = codigo * _ESCALA_CHAVE + np.maximum(anterior, atual)
+            # Subindo, o intervalo é (anterior, atual]; caindo, [atual, anterior)
+            inicio = np.where(subiu, np.searchsorted(self._chave, menor, "right"), np.searchsorted(self._chave, menor, "left"))
+            fim = np.where(subiu, np.searchsorted(self._chave, maior, "right"), np.searchsorted(self._chave, maior, "left"))
+
+            # Posições de todos os limites cruzados, de uma vez
+            tamanhos = fim - inicio
+            origem = np.repeat(np.arange(len(tamanhos)), tamanhos)
+            posicoes = inicio[origem] + np.arange(tamanhos.sum()) - np.repeat(np.cumsum(tamanhos) - tamanhos, tamanhos)
+            sentido = np.where(subiu, 1, -1)[origem]
+            aceitos = (self._direcao[posicoes] == 0) | (self._direcao[posicoes] == sentido)
+
+            disparos = []
+            for posicao, i in zip(posicoes[aceitos], origem[aceitos]):
+                alerta = self._alertas[posicao]
+                if agora - self._notificado_em.get(alerta, -np.inf) < self.intervalo_minimo:
+                    continue
+                self._notificado_em[alerta] = agora
+                disparo = Disparo(alerta, float(anterior[i]), float(atual[i]))
+                self._pendentes[alerta.email].append(disparo)
+                disparos.append(disparo)
+            contar("alertas_disparados", len(disparos))
+            return disparos
+
+    # Avalia um treasurybondsinfo.json já decodificado
+    def processar_snapshot(self, snapshot, agora=None):
+        tabela = tabela_titulos(snapshot)
+        return self.processar(dict(zip(tabela["Título"], tabela[COLUNA_TAXA])), agora)
+
+    # Envia um e-mail por usuário com todos os disparos pendentes do ciclo
+    def despachar(self, enviar):
+        """
+        enviar(destinatarios, assunto, corpo, anexo): ex.: enviador_smtp ou send_email_lote do app_prod;
+        destinatarios são Destinatario com assunto e corpo próprios
+        Disparos de envios que falharam voltam para a fila do próximo ciclo.
+        """
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, defaultdict(list)
+        if not pendentes:
+            return []
+        destinatarios = [
+            Destinatario(email, assunto_alerta(disparos), corpo_alerta(disparos)) for email, disparos in pendentes.items()
+        ]
+        try:
+            resultados = enviar(destinatarios, None, None, None)
+        except Exception as e:
+            resultados = [ResultadoEnvio(d.email, False, str(e)) for d in destinatarios]
+        with self._lock:
+            for resultado in resultados:
+                if not resultado.sucesso:
+                    self._pendentes[resultado.email][:0] = pendentes[resultado.email]
+        contar("alertas_emails", sum(r.sucesso for r in resultados))
+        return resultados
+
+    # Alertas pendentes de envio, por usuário
+    def pendentes(self):
+        with self._lock:
+            return {email: list(disparos) for email, disparos in self._pendentes.items()}
+
+    # Estado entre ciclos, serializável em JSON; notificações fora do intervalo mínimo são descartadas
+    def estado(self, agora=None):
+        agora = time.time() if agora is None else agora
+        with self._lock:
+            return {
+                "ultimas_taxas": dict(self._ultimas_taxas),
+                "notificado_em": [
+                    [list(alerta), quando] for alerta, quando in self._notificado_em.items()
+                    if agora - quando < self.intervalo_minimo
+                ],
+                "pendentes": {
+                    email: [[list(d.alerta), d.taxa_anterior, d.taxa_atual] for d in disparos]
+                    for email, disparos in self._pendentes.items() if disparos
+                },
+            }
+
+    # Retoma o estado gravado por estado()
+    def restaurar(self, estado):
+        with self._lock:
+            self._ultimas_taxas = dict(estado.get("ultimas_taxas", {}))
+            self._notificado_em = {Alerta(*alerta): quando for alerta, quando in estado.get("notificado_em", [])}
+            self._pendentes = defaultdict(list)
+            for email, disparos in estado.get("pendentes", {}).items():
+                self._pendentes[email] = [Disparo(Alerta(*alerta), anterior, atual) for alerta, anterior, atual in disparos]
+
+
+def carregar_estado(caminho=ESTADO_FILE):
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def salvar_estado(motor, caminho=ESTADO_FILE, agora=None):
+    with trava_recurso(caminho):
+        _gravar_json(motor.estado(agora), caminho)
+
+
+# Um ciclo completo a partir do disco: alertas e estado são lidos, o snapshot é avaliado,
+# os e-mails saem e o estado é gravado de volta. A trava do estado faz com que vários
+# processos (réplicas, reinícios) nunca avaliem o mesmo snapshot em paralelo
+def ciclo_alertas(snapshot, enviar, caminho=ALERTAS_FILE, caminho_estado=ESTADO_FILE, agora=None,
+                  intervalo_minimo=INTERVALO_MINIMO):
+    """
+    enviar: como em MotorAlertas.despachar (ex.: enviador_smtp)
+    Retorna os ResultadoEnvio do ciclo.
+    """
+    with trava_recurso(caminho_estado):
+        motor = MotorAlertas(carregar_alertas(caminho), intervalo_minimo)
+        motor.restaurar(carregar_estado(caminho_estado))
+        motor.processar_snapshot(snapshot, agora)
+        # Gravado antes do envio: uma queda no meio do ciclo não perde os disparos pendentes
+        salvar_estado(motor, caminho_estado, agora)
+        resultados = motor.despachar(enviar)
+        salvar_estado(motor, caminho_estado, agora)
+    return resultados
+
+
+# Envio dos alertas por SMTP, com a seção [email] do secrets.toml do app_prod
+def enviador_smtp(config):
+    def enviar(destinatarios, assunto, corpo, anexo):
+        with SessaoSMTP(config["SMTP_SERVER"], int(config["SMTP_PORT"]),
+                        config["EMAIL_ADDRESS"], config["EMAIL_PASSWORD"]) as sessao:
+            return sessao.enviar_lote(config["EMAIL_ADDRESS"], destinatarios, assunto, corpo)
+    return enviar
+
+
+def assunto_alerta(disparos):
+    if len(disparos) == 1:
+        return f"Alerta Tesouro Direto: {disparos[0].alerta.titulo}"
+    return f"Alerta Tesouro Direto: {len(disparos)} títulos cruzaram sua taxa de referência"
+
+
+def corpo_alerta(disparos):
+    linhas = ["As taxas abaixo cruzaram os limites que você cadastrou:", ""]
+    for d in disparos:
+        movimento = "subiu" if d.taxa_atual > d.taxa_anterior else "caiu"
+        linhas.append(
+            f"- {d.alerta.titulo}: {movimento} de {d.taxa_anterior:.2f}% para {d.taxa_atual:.2f}% "
+            f"(limite {d.alerta.taxa:.2f}%)"
+        )
+    return "\n".join(linhas)
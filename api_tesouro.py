@@ -2,15 +2,85 @@
 import urllib3
 urllib3.disable_warnings()
 import json
-import requests
+import threading
+import time
+from operator import itemgetter
 import pandas as pd
 from datetime import datetime
 
+from metricas import medir, instrumentar, registrar_cache, registrar_bytes
+from transporte import obter_sessao
+
+# Decodificador JSON mais rápido, se estiver instalado
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+URL_TESOURO_JSON = 'https://www.tesourodireto.com.br/json/br/com/b3/tesourodireto/service/api/treasurybondsinfo.json'
+
+# Tempo (em segundos) durante o qual o mesmo snapshot é reaproveitado
+SNAPSHOT_TTL = 60
+
+_snapshot_cache = {'dados': None, 'obtido_em': 0.0}
+_snapshot_lock = threading.Lock()
+
+
+# Converte o corpo da resposta com o decodificador escolhido
+def decodificar_json(conteudo, decoder=None):
+    """
+    decoder: 'orjson', 'json' ou None (usa orjson quando disponível)
+    """
+    if decoder is None:
+        decoder = 'orjson' if orjson is not None else 'json'
+    if decoder == 'orjson':
+        if orjson is None:
+            raise ImportError("O decodificador 'orjson' não está instalado.")
+        return orjson.loads(conteudo)
+    if decoder == 'json':
+        return json.loads(conteudo)
+    raise ValueError(f"Decodificador desconhecido: {decoder}")
+
+
+# Baixa e converte o treasurybondsinfo.json no máximo uma vez por janela de TTL
+def obter_snapshot(ttl=SNAPSHOT_TTL, forcar=False, decoder=None):
+    """
+    ttl: segundos em que o snapshot em memória continua válido
+    forcar: True para ignorar o cache e buscar novamente
+    decoder: ver decodificar_json()
+    O dict retornado é compartilhado entre chamadas e não deve ser alterado.
+    """
+    # O lock também evita que sessões simultâneas disparem downloads repetidos
+    with _snapshot_lock:
+        dados = _snapshot_cache['dados']
+        if not forcar and dados is not None and time.monotonic() - _snapshot_cache['obtido_em'] < ttl:
+            registrar_cache('snapshot', True)
+            return dados
+        registrar_cache('snapshot', False)
+        with medir('obter_snapshot'):
+            resposta = obter_sessao().get(URL_TESOURO_JSON, verify=False, timeout=30)
+            resposta.raise_for_status()
+            registrar_bytes('api_tesouro', len(resposta.content))
+            dados = decodificar_json(resposta.content, decoder)
+        _snapshot_cache['dados'] = dados
+        _snapshot_cache['obtido_em'] = time.monotonic()
+        return dados
+
+
+# Decodifica um treasurybondsinfo.json baixado por fora (ex.: pela fonte "Tesouro Direto (API)"
+# do fontes.py) e o torna o snapshot atual de obter_snapshot()
+def guardar_snapshot(conteudo, decoder=None):
+    dados = decodificar_json(conteudo, decoder)
+    with _snapshot_lock:
+        _snapshot_cache['dados'] = dados
+        _snapshot_cache['obtido_em'] = time.monotonic()
+    return dados
+
+
 # Verifica se mercado está aberto ou fechado
-# ...existing code...
-def status_mercado_df():
-    url = 'https://www.tesourodireto.com.br/json/br/com/b3/tesourodireto/service/api/treasurybondsinfo.json'
-    resp_dict = requests.get(url, verify=False).json()
+@instrumentar('status_mercado_df')
+def status_mercado_df(snapshot=None):
+    resp_dict = snapshot if snapshot is not None else obter_snapshot()
     mkt = resp_dict['response']['TrsrBondMkt']
     
     # Converte datas e horários para o formato desejado
@@ -30,60 +100,68 @@ def status_mercado_df():
     return df
 
 
-def consultaTD(op,tp):
+# Campos lidos de cada TrsrBd, na ordem das colunas da tabela
+_CAMPOS_TITULO = itemgetter('nm', 'mtrtyDt', 'anulInvstmtRate', 'untrInvstmtVal', 'anulRedRate', 'untrRedVal')
+COLUNAS_TITULO = ['Tipo', 'Título', 'Vencimento',
+                  'Rentabilidade (Compra)', 'Preço R$ (Compra)',
+                  'Rentabilidade (Venda)', 'Preço R$ (Venda)']
+_COLUNAS_OPERACAO = {
+    'C': ['Tipo', 'Título', 'Vencimento', 'Rentabilidade (Compra)', 'Preço R$ (Compra)'],
+    'V': ['Tipo', 'Título', 'Vencimento', 'Rentabilidade (Venda)', 'Preço R$ (Venda)'],
+}
+TIPOS_TD = {'S': 'SELIC', 'P': 'PREFIXADO', 'I': 'IPCA'}
+
+
+# Monta a tabela de todos os títulos em uma única passada pelo JSON
+def tabela_titulos(snapshot=None):
     """
-    op:'C','V','' para Compra, Venda ou ambos
-    tp:'S','P','I', '' para Selic, Prefixado, IPCA ou todos
+    Retorna um DataFrame tipado com uma linha por título:
+    'Tipo' categórico, 'Vencimento' datetime e taxas/preços em float.
     """
-    op = op
-    tp = tp
-    
-    url = 'https://www.tesourodireto.com.br/json/br/com/b3/tesourodireto/service/api/treasurybondsinfo.json'
-    resp_dict = requests.get(url,verify=False).json()
-    
-    n_titulos = len(resp_dict['response']['TrsrBdTradgList'])
-    
-    tipos = []
-    nomes = []
-    tx_compras = []
-    tx_vendas = []
-    p_compras = []
-    p_vendas = []
-    vencimentos = []
-    
-    
-    for i in range(n_titulos):
-        tipos.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['FinIndxs']['nm']) 
-        nomes.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['nm'])
-        vencimentos.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['mtrtyDt'])
-        tx_compras.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['anulInvstmtRate'])
-        p_compras.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['untrInvstmtVal'])
-        tx_vendas.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['anulRedRate'])
-        p_vendas.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['untrRedVal']) 
-    
-    
-    df = pd.DataFrame()
-    df['Tipo'] = tipos
-    df['Título'] = nomes
-    df['Vencimento'] = pd.to_datetime(vencimentos)
-    df['Rentabilidade (Compra)'] = tx_compras
-    df['Preço R$ (Compra)'] = p_compras    
-    df['Rentabilidade (Venda)'] = tx_vendas
-    df['Preço R$ (Venda)'] = p_vendas
-    
-    if tp == 'S':
-        df = df.iloc[df[df['Tipo']=='SELIC'].index]
-    elif tp == 'P':
-        df = df.iloc[df[df['Tipo']=='PREFIXADO'].index]
-    elif tp == 'I':
-        df = df.iloc[df[df['Tipo']=='IPCA'].index]
-    else:
-        df = df
-        
+    resp_dict = snapshot if snapshot is not None else obter_snapshot()
+    registros = []
+    for item in resp_dict['response']['TrsrBdTradgList']:
+        bd = item['TrsrBd']
+        registros.append((bd['FinIndxs']['nm'],) + _CAMPOS_TITULO(bd))
+
+    df = pd.DataFrame.from_records(registros, columns=COLUNAS_TITULO)
+    df['Tipo'] = df['Tipo'].astype('category')
+    df['Vencimento'] = pd.to_datetime(df['Vencimento'])
+    colunas_valor = COLUNAS_TITULO[3:]
+    df[colunas_valor] = df[colunas_valor].astype('float64')
+    return df
+
+
+# Aplica o filtro de operação sobre a tabela de títulos
+def _filtra_operacao(df, op):
     if op == 'C':
-        return df[df['Preço R$ (Compra)']!=0].drop(df.columns[[5, 6]],axis=1)
+        return df.loc[df['Preço R$ (Compra)'] != 0, _COLUNAS_OPERACAO['C']]
     elif op == 'V':
-        return df.drop(df.columns[[3, 4]],axis=1)
+        return df[_COLUNAS_OPERACAO['V']]
     else:
         return df
 
+
+# Todos os grupos de tipo de uma operação a partir de uma única tabela
+@instrumentar('consultaTD_grupos')
+def consultaTD_grupos(op='C', snapshot=None):
+    """
+    op:'C','V','' para Compra, Venda ou ambos
+    Retorna um dict {tipo: DataFrame} (ex.: 'SELIC', 'PREFIXADO', 'IPCA'),
+    com as mesmas colunas de consultaTD(op, tp).
+    """
+    df = _filtra_operacao(tabela_titulos(snapshot), op)
+    return {tipo: grupo for tipo, grupo in df.groupby('Tipo', observed=True, sort=False)}
+
+
+@instrumentar('consultaTD')
+def consultaTD(op,tp,snapshot=None):
+    """
+    op:'C','V','' para Compra, Venda ou ambos
+    tp:'S','P','I', '' para Selic, Prefixado, IPCA ou todos
+    snapshot: resultado de obter_snapshot() para reaproveitar o mesmo download
+    """
+    df = tabela_titulos(snapshot)
+    if tp in TIPOS_TD:
+        df = df[df['Tipo'] == TIPOS_TD[tp]]
+    return _filtra_operacao(df, op)
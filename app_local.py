@@ -1,13 +1,9 @@
 import streamlit as st
 import pandas as pd
 import os
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+from envio_email import SessaoSMTP, montar_anexo
 from dotenv import load_dotenv
-import requests
+from transferencia import baixar_arquivo
 
 # Carrega variáveis do .env
 load_dotenv()
@@ -46,10 +42,8 @@ def download_spreadsheet():
 # Função para baixar CSV do Tesouro
 def baixar_csv(url, caminho_arquivo):
     try:
-        resposta = requests.get(url)
-        resposta.raise_for_status()
-        with open(caminho_arquivo, 'wb') as arquivo:
-            arquivo.write(resposta.content)
+        # Download em blocos, condicional (304 não transfere nada) e retomável
+        baixar_arquivo(url, caminho_arquivo)
         return True, caminho_arquivo
     except Exception as e:
         return False, str(e)
@@ -57,29 +51,10 @@ def baixar_csv(url, caminho_arquivo):
 # Função para enviar e-mail
 def send_email(to_email, subject, body, attachment_path):
     try:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_ADDRESS
-        msg['To'] = to_email
-        msg['Subject'] = subject
-
-        msg.attach(MIMEText(body, 'plain'))
-
-        with open(attachment_path, "rb") as attachment:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(attachment.read())
-            encoders.encode_base64(part)
-            part.add_header(
-                'Content-Disposition',
-                f'attachment; filename={os.path.basename(attachment_path)}',
-            )
-            msg.attach(part)
-
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            server.send_message(msg)
-        
-        return True, None
+        anexos = [montar_anexo(attachment_path)]
+        with SessaoSMTP(SMTP_SERVER, SMTP_PORT, EMAIL_ADDRESS, EMAIL_PASSWORD) as sessao:
+            resultado = sessao.enviar_lote(EMAIL_ADDRESS, [to_email], subject, body, anexos)[0]
+        return resultado.sucesso, resultado.erro
     except Exception as e:
         return False, str(e)
 
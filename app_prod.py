@@ -1,46 +1,97 @@
 import streamlit as st
 import pandas as pd
 import os
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-import requests
+from envio_email import SessaoSMTP, ResultadoEnvio, montar_anexo
+from exportacao import exportar_csv, ResultadoExportacao
+from transferencia import baixar_arquivo
+from historico_tesouro import sondar_csv_tesouro
+from api_tesouro import SNAPSHOT_TTL, URL_TESOURO_JSON, guardar_snapshot, obter_snapshot, tabela_titulos
+from alertas_tesouro import Alerta, DIRECOES, atualizar_alertas, carregar_alertas
+from fontes import Fonte, registrar_fonte, atualizar_fontes
+from metricas import medir, registrar_bytes, painel_diagnostico
+from transporte import obter_sessao
+from cache_compartilhado import obter_compartilhado, trava_recurso
 import platform  # ➕ Para identificar ambiente operacional
 import json
 import hashlib
+import hmac
+import threading
 
 # --- GERENCIAMENTO DE USUÁRIOS ---
 
 USERS_FILE = "usuarios.json"
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def load_users():
-    users = []
+# Iterações do PBKDF2-SHA256 usado na verificação de senhas
+KDF_ITERACOES = 200_000
+
+def hash_password(password, salt):
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, KDF_ITERACOES)
+
+# Versão dos secrets: data de modificação dos arquivos de secrets (barata, sem ler os usuários)
+def _versao_secrets():
+    versao = []
+    for caminho in st.get_option("secrets.files"):
+        try:
+            versao.append((caminho, os.stat(caminho).st_mtime_ns))
+        except OSError:
+            pass
+    return tuple(versao)
+
+# Índice e-mail -> registro, compartilhado pelo processo e refeito só quando os secrets mudam;
+# o hash de cada senha só é calculado na primeira verificação daquele usuário
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _indice_usuarios(versao):
+    indice = {}
     for key, user in st.secrets["users"].items():
-        users.append({
+        indice[user["email"]] = {
             "email": user["email"],
-            "password": hash_password(user["password"]),
-            "admin": user.get("admin", False)
-        })
-    return users
+            "admin": user.get("admin", False),
+            "chave": key,
+            "salt": None,
+            "password": None,
+        }
+    return indice, threading.Lock()
+
+def user_index():
+    return _indice_usuarios(_versao_secrets())[0]
+
+def load_users():
+    return [{"email": u["email"], "admin": u["admin"]} for u in user_index().values()]
+
+# Salt e hash da senha de um usuário, calculados uma única vez por processo
+def _credencial(email):
+    indice, lock = _indice_usuarios(_versao_secrets())
+    user = indice[email]
+    with lock:
+        if user["password"] is None:
+            salt = os.urandom(16)
+            user["password"] = hash_password(st.secrets["users"][user["chave"]]["password"], salt)
+            user["salt"] = salt
+    return user["salt"], user["password"]
+
+# Salt e hash fictícios (um por processo): e-mails desconhecidos pagam o mesmo PBKDF2 que os cadastrados
+@st.cache_resource(show_spinner=False)
+def _credencial_ficticia():
+    salt = os.urandom(16)
+    return salt, hash_password(os.urandom(16).hex(), salt)
+
+# Verifica a senha em tempo constante, sem revelar pelo tempo se o e-mail existe
+def verify_password(email, password):
+    existe = email in user_index()
+    salt, esperado = _credencial(email) if existe else _credencial_ficticia()
+    return hmac.compare_digest(hash_password(password, salt), esperado) and existe
 
 def save_users(users):
     st.warning("Salvar usuários no TOML não é suportado em tempo de execução. Edite o arquivo secrets.toml manualmente.")
 
 def authenticate(email, password):
-    users = load_users()
-    for user in users:
-        if user["email"] == email and user["password"] == hash_password(password):
-            return user
+    if verify_password(email, password):
+        user = user_index()[email]
+        return {"email": user["email"], "admin": user["admin"]}
     return None
 
 def user_exists(email):
-    users = load_users()
-    return any(u["email"] == email for u in users)
+    return email in user_index()
 
 def add_user(email, password, admin=False):
     st.warning("Adicionar usuários só é possível editando o arquivo secrets.toml.")
@@ -79,52 +130,85 @@ TESOURO_URL = "https://www.tesourotransparente.gov.br/ckan/dataset/df56aa42-484a
 TESOURO_FILE_NAME = "PrecoTaxaTesouroDireto.csv"
 TESOURO_FILE_PATH = os.path.normpath(os.path.join(DOWNLOAD_FOLDER, TESOURO_FILE_NAME))
 
-# Função para download da planilha do Neto
+NETO_SHEET_URL = f"https://docs.google.com/spreadsheets/d/{NETO_SHEET_ID}/gviz/tq?tqx=out:csv&sheet={NETO_SHEET_NAME}"
+
+# Segundos em que um download feito por qualquer sessão (ou processo) é reaproveitado
+IDADE_MAXIMA_PLANILHA = 60
+IDADE_MAXIMA_CSV = 5 * 60
+
+# Converte o CSV exportado da planilha do Neto e grava a saída (xlsx, parquet ou csv, pela extensão)
+# só quando o conteúdo mudou; retorna um ResultadoExportacao com as diferenças
+def salvar_planilha(conteudo):
+    # Uma gravação por vez, mesmo entre processos do servidor
+    with trava_recurso(NETO_FILE_PATH):
+        return exportar_csv(conteudo, NETO_FILE_PATH)
+
+def _baixar_planilha():
+    resposta = obter_sessao().get(NETO_SHEET_URL, timeout=30)
+    resposta.raise_for_status()
+    registrar_bytes("Preço Teto", len(resposta.content))
+    return salvar_planilha(resposta.content)
+
+# Função para download da planilha do Neto; a falha fica registrada no span antes de virar (False, erro)
 def download_spreadsheet():
     try:
-        url = f"https://docs.google.com/spreadsheets/d/{NETO_SHEET_ID}/gviz/tq?tqx=out:csv&sheet={NETO_SHEET_NAME}"
-        df = pd.read_csv(url)
-        df.to_excel(NETO_FILE_PATH, index=False)
-        return True, NETO_FILE_PATH
+        with medir("download_spreadsheet"):
+            # Cliques simultâneos de várias sessões resultam em um único download
+            resultado = obter_compartilhado(NETO_FILE_PATH, _baixar_planilha, IDADE_MAXIMA_PLANILHA)
+        if resultado.do_cache:
+            return True, ResultadoExportacao(NETO_FILE_PATH, False, None)
+        return True, resultado.valor
     except Exception as e:
         return False, str(e)
 
 # Função para baixar CSV do Tesouro
 def baixar_csv(url, caminho_arquivo):
     try:
-        resposta = requests.get(url)
-        resposta.raise_for_status()
-        with open(caminho_arquivo, 'wb') as arquivo:
-            arquivo.write(resposta.content)
+        # Download em blocos, condicional (304 não transfere nada) e retomável,
+        # feito por uma única sessão de cada vez e reaproveitado por IDADE_MAXIMA_CSV
+        with medir("baixar_csv"):
+            obter_compartilhado(caminho_arquivo, lambda: baixar_arquivo(url, caminho_arquivo), IDADE_MAXIMA_CSV)
         return True, caminho_arquivo
     except Exception as e:
         return False, str(e)
 
+# Fontes atualizadas juntas pelo botão "Atualizar tudo"
+registrar_fonte(Fonte("Preço Teto", NETO_SHEET_URL, salvar_planilha, ttl=0, timeout=30))
+registrar_fonte(Fonte("Tesouro Direto (CSV)", TESOURO_URL, sondar_csv_tesouro, ttl=0, timeout=120, caminho=TESOURO_FILE_PATH))
+# O JSON baixado passa a ser o snapshot usado por obter_snapshot() (ex.: títulos da aba de alertas)
+registrar_fonte(Fonte("Tesouro Direto (API)", URL_TESOURO_JSON, guardar_snapshot, ttl=SNAPSHOT_TTL, timeout=30, verificar_ssl=False))
+
 # Função para enviar e-mail
 def send_email(to_email, subject, body, attachment_path):
+    resultado = send_email_lote([to_email], subject, body, attachment_path)[0]
+    return resultado.sucesso, resultado.erro
+
+# Envia para vários destinatários com uma única sessão SMTP (um handshake TLS/login por lote)
+def send_email_lote(destinatarios, subject, body, attachment_path, compressao=None):
+    """
+    destinatarios: e-mails (str) ou Destinatario com assunto/corpo próprios
+    attachment_path: None para mensagens sem anexo (ex.: alertas)
+    compressao: None, 'gzip' ou 'zip' para compactar o anexo (ex.: o CSV do Tesouro)
+    Retorna um ResultadoEnvio por destinatário.
+    """
     try:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_ADDRESS
-        msg['To'] = to_email
-        msg['Subject'] = subject
-
-        msg.attach(MIMEText(body, 'plain'))
-
-        with open(attachment_path, "rb") as attachment:
-            part = MIMEBase('application', 'octet-stream')
-            part.set_payload(attachment.read())
-            encoders.encode_base64(part)
-            part.add_header('Content-Disposition', f'attachment; filename={os.path.basename(attachment_path)}')
-            msg.attach(part)
-
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            server.send_message(msg)
-
-        return True, None
+        with medir("send_email"):
+            # O anexo codificado fica em cache pelo hash do conteúdo entre envios
+            anexos = [montar_anexo(attachment_path, compressao)] if attachment_path else []
+            with SessaoSMTP(SMTP_SERVER, SMTP_PORT, EMAIL_ADDRESS, EMAIL_PASSWORD) as sessao:
+                return sessao.enviar_lote(EMAIL_ADDRESS, destinatarios, subject, body, anexos)
     except Exception as e:
-        return False, str(e)
+        return [ResultadoEnvio(d if isinstance(d, str) else d.email, False, str(e)) for d in destinatarios]
+
+# Criação e remoção de alertas sobre a lista lida sob a trava (sessões simultâneas do mesmo
+# usuário não desfazem as edições umas das outras); a avaliação e os e-mails ficam com o
+# gravador_tesouro.py
+def criar_alerta(alerta):
+    atualizar_alertas(lambda alertas: alertas if alerta in alertas else alertas + [alerta])
+
+def remover_alertas(removidos):
+    removidos = set(removidos)
+    atualizar_alertas(lambda alertas: [a for a in alertas if a not in removidos])
 
 # --- TELA DE LOGIN E GERENCIAMENTO DE USUÁRIOS ---
 def login_screen():
@@ -207,7 +291,7 @@ def change_password_screen():
     new_password2 = st.text_input("Confirme a nova senha", type="password")
     if st.button("Alterar senha", key="btn_alterar_senha"):
         user = st.session_state.user
-        if hash_password(old_password) != user["password"]:
+        if not verify_password(user["email"], old_password):
             st.warning("Senha atual incorreta.")
         elif new_password != new_password2:
             st.warning("As novas senhas não coincidem.")
@@ -216,8 +300,6 @@ def change_password_screen():
         else:
             update_user(user["email"], password=new_password)
             st.success("Senha alterada com sucesso!")
-            # Atualiza a senha na sessão
-            st.session_state.user["password"] = hash_password(new_password)
 
     if st.button("Voltar", key="btn_voltar_senha"):
         st.session_state.show_change_password = False
@@ -254,6 +336,9 @@ def main():
     if st.sidebar.button("Sair"):
         st.session_state.user = None
         st.rerun()
+    # Painel de tempos, caches e bytes (admin, com ?diagnostico=1 na URL)
+    if st.session_state.user.get("admin"):
+        painel_diagnostico()
 
     # Apenas admin pode acessar as telas de gerenciamento e alteração de senha
     if not st.session_state.user.get("admin"):
@@ -273,7 +358,23 @@ def main():
     if not all([EMAIL_ADDRESS, EMAIL_PASSWORD]):
         st.error("⚠️ Configuração de e-mail incompleta. Verifique o secrets.toml")
 
-    tab1, tab2 = st.tabs(["Preço Teto", "Tesouro Direto"])
+    if st.button("🔄 Atualizar tudo"):
+        resultados = atualizar_fontes()
+        st.dataframe(pd.DataFrame([
+            {
+                "Fonte": r.nome,
+                "Status": "✅" if r.sucesso else "❌",
+                "Tempo (s)": round(r.duracao, 2),
+                "Erro": r.erro or "",
+            }
+            for r in resultados.values()
+        ]), hide_index=True, use_container_width=True)
+        if resultados["Preço Teto"].sucesso:
+            st.session_state.neto_downloaded = True
+        if resultados["Tesouro Direto (CSV)"].sucesso:
+            st.session_state.tesouro_downloaded = True
+
+    tab1, tab2, tab3 = st.tabs(["Preço Teto", "Tesouro Direto", "Alertas de Taxa"])
 
     with tab1:
         st.header("📥 Preço Teto")
@@ -283,7 +384,13 @@ def main():
             if st.button("⬇️ Baixar Planilha"):
                 success, result = download_spreadsheet()
                 if success:
-                    st.success(f"✅ Planilha salva em:\n{result}")
+                    if result.alterado:
+                        st.success(f"✅ Planilha salva em:\n{result.caminho}")
+                    else:
+                        st.info(f"ℹ️ A planilha não mudou desde o último download:\n{result.caminho}")
+                    if result.diferencas is not None and not result.diferencas.empty:
+                        st.write("**Alterações em relação à versão anterior:**")
+                        st.dataframe(result.diferencas, hide_index=True, use_container_width=True)
                     st.session_state.neto_downloaded = True
                 else:
                     st.error(f"❌ Falha no download:\n{result}")
@@ -295,19 +402,21 @@ def main():
             if not os.path.exists(NETO_FILE_PATH) and not st.session_state.get('neto_downloaded'):
                 st.warning("⚠️ Faça o download da planilha primeiro!")
             else:
-                to_email = st.text_input("Destinatário:", placeholder="email@exemplo.com")
+                to_email = st.text_input("Destinatário(s):", placeholder="email@exemplo.com, outro@exemplo.com")
                 subject = st.text_input("Assunto:", value="Planilha de Investimentos")
                 body = st.text_area("Mensagem:", value="Segue em anexo a planilha solicitada.")
 
                 if st.button("✉️ Enviar E-mail"):
-                    if not to_email or "@" not in to_email:
+                    destinatarios = [e.strip() for e in to_email.replace(";", ",").split(",") if e.strip()]
+                    if not destinatarios or any("@" not in e for e in destinatarios):
                         st.warning("Por favor, insira um e-mail válido")
                     else:
-                        success, error_msg = send_email(to_email, subject, body, NETO_FILE_PATH)
-                        if success:
-                            st.success("✅ E-mail enviado com sucesso!")
-                        else:
-                            st.error(f"❌ Falha no envio: {error_msg}")
+                        resultados = send_email_lote(destinatarios, subject, body, NETO_FILE_PATH)
+                        for resultado in resultados:
+                            if resultado.sucesso:
+                                st.success(f"✅ E-mail enviado com sucesso para {resultado.email}!")
+                            else:
+                                st.error(f"❌ Falha no envio para {resultado.email}: {resultado.erro}")
 
     with tab2:
         st.header("📥 Tesouro Direto")
@@ -320,13 +429,15 @@ def main():
                 
                 # Display latest Data Base after successful download
                 try:
-                    df = pd.read_csv(TESOURO_FILE_PATH, sep=';', encoding='latin1')
-                    
-                    if "Data Base" in df.columns:
-                        df["Data Base"] = pd.to_datetime(df["Data Base"], dayfirst=True, errors='coerce')
-                        latest_date = df["Data Base"].max()
-                        formatted_date = latest_date.strftime('%d/%m/%Y')
-                        st.info(f"📅 Data de atualização dos dados: {formatted_date}")
+                    # Resumo lido do arquivo auxiliar quando o CSV não mudou desde a última sondagem
+                    resumo = sondar_csv_tesouro(TESOURO_FILE_PATH)
+
+                    if resumo["ultima_data"] is not None:
+                        formatted_date = resumo["ultima_data"].strftime('%d/%m/%Y')
+                        st.info(
+                            f"📅 Data de atualização dos dados: {formatted_date} "
+                            f"({resumo['linhas']} linhas, {len(resumo['titulos'])} títulos)"
+                        )
                     else:
                         st.warning("⚠️ A coluna 'Data Base' não foi encontrada no arquivo.")
 
@@ -345,6 +456,37 @@ def main():
                 st.error(f"❌ Falha no download:\n{result}")
                 st.session_state.tesouro_downloaded = False
 
+    with tab3:
+        st.header("🔔 Alertas de Taxa")
+        st.caption("Você recebe um e-mail quando a Rentabilidade (Compra) de um título cruzar a taxa cadastrada.")
+        email = st.session_state.user["email"]
+        meus = [a for a in carregar_alertas() if a.email == email]
+
+        try:
+            titulos = list(tabela_titulos(obter_snapshot())["Título"])
+        except Exception as e:
+            titulos = []
+            st.warning(f"⚠️ Não foi possível carregar os títulos: {e}")
+        if titulos:
+            col1, col2, col3 = st.columns([3, 1, 1])
+            titulo = col1.selectbox("Título", titulos)
+            taxa = col2.number_input("Taxa (%)", min_value=0.0, max_value=100.0, value=6.0, step=0.01, format="%.2f")
+            direcao = col3.selectbox("Quando", list(DIRECOES))
+            if st.button("➕ Criar alerta"):
+                criar_alerta(Alerta(email, titulo, round(taxa, 2), direcao))
+                st.rerun()
+
+        if meus:
+            selecionados = st.dataframe(
+                pd.DataFrame([{"Título": a.titulo, "Taxa (%)": a.taxa, "Quando": a.direcao} for a in meus]),
+                hide_index=True, use_container_width=True, on_select="rerun", selection_mode="multi-row",
+            ).selection.rows
+            if selecionados and st.button("🗑️ Remover selecionados"):
+                remover_alertas([meus[i] for i in selecionados])
+                st.rerun()
+        else:
+            st.info("Nenhum alerta cadastrado.")
+
 if __name__ == "__main__":
     if 'neto_downloaded' not in st.session_state:
         st.session_state.neto_downloaded = False
@@ -3,15 +3,58 @@ import pandas as pd
 import numpy as np
 
 # Importa funções do api_tesouro.py
-from api_tesouro import status_mercado_df, consultaTD
+from api_tesouro import SNAPSHOT_TTL, obter_snapshot, status_mercado_df, consultaTD_grupos
+from historico_tesouro import atualizar_armazem, ler_ultima_data_base, preparar_historico, ultima_data_armazem
+from comparacao_tesouro import construir_indice_pu, comparar_com_d1, colorir_por_referencia
+from gravador_tesouro import ler_ultimo_snapshot, serie_intradiaria, ultima_captura
+from curva_tesouro import carregar_curvas, curva_do_dia
+from precificacao_tesouro import precificar_titulos
+from estatisticas_tesouro import JANELA_VOLATILIDADE, atualizar_estatisticas, ler_resumo_estatisticas
+from metricas import medir, falha_cache, consulta_cache, painel_diagnostico
 
 # URL do arquivo do Tesouro Direto
 TESOURO_URL = "https://www.tesourotransparente.gov.br/ckan/dataset/df56aa42-484a-4a59-8184-7676580c81e3/resource/796d2059-14e9-44e3-80c9-2d9e30b405c1/download/PrecoTaxaTesouroDireto.csv"
+# Intervalo mínimo (em segundos) entre atualizações do armazenamento local
+TESOURO_IDADE_MAXIMA = 6 * 60 * 60
 
-# === SIDEBAR: Imagem, Status do Mercado e Taxas de Referência ===
+
+# === DADOS: cada carga fica atrás de um cache com versão; mexer nas taxas de
+# referência só reestiliza as tabelas (fragmento), sem rede e sem refazer a comparação ===
+
+# Série do dia gravada pelo gravador_tesouro.py (vazia se ele não estiver rodando)
+@st.cache_data(ttl=60)
+def load_intradiario():
+    falha_cache("load_intradiario")
+    return serie_intradiaria()
+
+# Status e grupos de títulos de um único snapshot: o da última captura do gravador
+# intradiário, se estiver em dia (captura_id), ou um download do treasurybondsinfo.json;
+# cada captura é reconstruída do SQLite uma só vez
+@st.cache_data(ttl=SNAPSHOT_TTL, max_entries=4, show_spinner=False)
+def load_mercado(captura_id):
+    falha_cache("load_mercado")
+    snapshot = None
+    if captura_id is not None:
+        snapshot = ler_ultimo_snapshot(somente_valido=False, captura_id=captura_id)
+    snapshot = snapshot or obter_snapshot()
+    grupos = consultaTD_grupos('C', snapshot)
+    # Versão do snapshot: muda só quando algum título muda de taxa ou preço
+    versao = int(sum(pd.util.hash_pandas_object(df, index=False).sum() for df in grupos.values()) % (1 << 63))
+    return {"status": status_mercado_df(snapshot), "grupos": grupos, "versao": versao}
+
+with consulta_cache("load_mercado"):
+    mercado = load_mercado(ultima_captura())
+GRUPOS = ["SELIC", "PREFIXADO", "IPCA"]
+grupos_compra = mercado["grupos"]
+titulos_atuais = {
+    nome: grupos_compra[nome][["Título", "Rentabilidade (Compra)", "Preço R$ (Compra)"]]
+    for nome in GRUPOS if nome in grupos_compra and not grupos_compra[nome].empty
+}
+
+# === SIDEBAR: Imagem e Status do Mercado ===
 with st.sidebar:
     st.image("tesouro_direto.jpeg", width=120, use_container_width=True)  # Removido caption
-    status_df = status_mercado_df()
+    status_df = mercado["status"]
     status = status_df["Status"].iloc[0]
     if status.lower() == "aberto":
         color = "green"
@@ -41,134 +84,166 @@ with st.sidebar:
     )
     st.dataframe(status_table, hide_index=True, use_container_width=True)
 
-    st.markdown("---")
-    st.markdown("#### Informe a taxa de referência para cada grupo:")
-    taxa_ref_selic = st.number_input("Taxa referência SELIC (%)", min_value=0.0, max_value=100.0, value=14.0, step=0.01, format="%.2f")
-    taxa_ref_prefixado = st.number_input("Taxa referência PREFIXADO (%)", min_value=0.0, max_value=100.0, value=14.0, step=0.01, format="%.2f")
-    taxa_ref_ipca = st.number_input("Taxa referência IPCA (%)", min_value=0.0, max_value=100.0, value=7.0, step=0.01, format="%.2f")
-
 # Título do app
 st.title("Análise de Variação do Tesouro Direto")
 
-# === ABAS: Mercado Agora e Comparação ===
-tab1, tab2 = st.tabs(["Mercado Agora", "Comparação"])
+# === ABAS: Mercado Agora, Comparação, Curva de Juros e Estatísticas ===
+tab1, tab2, tab3, tab4 = st.tabs(["Mercado Agora", "Comparação", "Curva de Juros", "Estatísticas"])
+
+
+# Taxas de referência e tabelas coloridas: um fragmento, reexecutado sozinho quando
+# uma taxa muda (widgets de fragmento não podem ficar na sidebar)
+@st.fragment
+def mercado_agora(grupos_compra, titulos_atuais):
+    with medir("aba:mercado_agora"):
+        st.markdown("#### Informe a taxa de referência para cada grupo:")
+        col1, col2, col3 = st.columns(3)
+        taxas_ref = {
+            'SELIC': col1.number_input("Taxa referência SELIC (%)", min_value=0.0, max_value=100.0, value=14.0, step=0.01, format="%.2f", key="taxa_ref_selic"),
+            'PREFIXADO': col2.number_input("Taxa referência PREFIXADO (%)", min_value=0.0, max_value=100.0, value=14.0, step=0.01, format="%.2f", key="taxa_ref_prefixado"),
+            'IPCA': col3.number_input("Taxa referência IPCA (%)", min_value=0.0, max_value=100.0, value=7.0, step=0.01, format="%.2f", key="taxa_ref_ipca"),
+        }
+        with consulta_cache("load_intradiario"):
+            intradiario = load_intradiario()
+        for nome in taxas_ref:
+            if nome in titulos_atuais:
+                st.write(f"**{nome}**")
+                exibir = titulos_atuais[nome]
+                # Quanto cada título custaria se fosse negociado à taxa de referência; a SELIC
+                # fica de fora: a referência é a taxa cheia e a do título, um spread sobre ela
+                if taxas_ref[nome] and nome != "SELIC":
+                    preco_ref = precificar_titulos(grupos_compra[nome], [taxas_ref[nome]]).iloc[:, 0]
+                    exibir = exibir.assign(**{"Preço na Taxa Ref. (R$)": preco_ref.round(2)})
+                # Colorir as taxas conforme referência (referência 0 não colore)
+                styled = colorir_por_referencia(exibir, ["Rentabilidade (Compra)"], taxas_ref[nome] or None)
+                st.dataframe(styled, hide_index=True, use_container_width=True)
+                serie = intradiario[intradiario["Tipo"] == nome]
+                if serie["Capturado em"].nunique() > 1:
+                    with st.expander(f"Rentabilidade intradiária - {nome}"):
+                        st.line_chart(serie.pivot(index="Capturado em", columns="Título", values="Rentabilidade (Compra)"))
+            else:
+                st.write(f"Não há dados para {nome}.")
+
 
 with tab1:
     st.subheader("Mercado Agora")
-    tipos = {'SELIC': 'S', 'PREFIXADO': 'P', 'IPCA': 'I'}
-    taxas_ref = {'SELIC': taxa_ref_selic, 'PREFIXADO': taxa_ref_prefixado, 'IPCA': taxa_ref_ipca}
-    titulos_atuais = {}
-    for nome, tp in tipos.items():
-        df_titulo = consultaTD('C', tp)
-        if not df_titulo.empty:
-            titulos_atuais[nome] = df_titulo[["Título", "Rentabilidade (Compra)", "Preço R$ (Compra)"]]
-            st.write(f"**{nome}**")
-            # Colorir as taxas conforme referência
-            def highlight_taxa(val):
-                try:
-                    taxa = float(val)
-                    ref = taxas_ref[nome]
-                    if ref == 0.0:
-                        return ''
-                    if taxa > ref:
-                        return 'background-color: #d4edda; color: #155724;'  # verde claro
-                    elif taxa < ref:
-                        return 'background-color: #f8d7da; color: #721c24;'  # vermelho claro
-                    else:
-                        return ''
-                except:
-                    return ''
-            styled = titulos_atuais[nome].style.applymap(highlight_taxa, subset=["Rentabilidade (Compra)"])
-            st.dataframe(styled, hide_index=True, use_container_width=True)
-        else:
-            st.write(f"Não há dados para {nome}.")
+    mercado_agora(grupos_compra, titulos_atuais)
 
-with tab2:
+with tab2, medir("aba:comparacao"):
     st.subheader("Comparação")
 
-    @st.cache_data
+    # Erros sobem (e não ficam em cache): quem chama registra a falha no span e avisa
+    @st.cache_data(ttl=TESOURO_IDADE_MAXIMA)
     def load_data(url):
-        try:
-            data = pd.read_csv(url, sep=";", decimal=",")
-            return data
-        except Exception as e:
-            st.error(f"Erro ao carregar os dados: {e}")
-            return None
+        falha_cache("load_data")
+        # Acrescenta só as datas novas ao armazenamento local e lê apenas a última Data Base
+        # Datas, decimais e tipos já saem convertidos do leitor; aqui só se ordena e limpa
+        atualizar_armazem(url, idade_maxima=TESOURO_IDADE_MAXIMA, engine="pyarrow")
+        data = ler_ultima_data_base()
+        return preparar_historico(data) if data is not None else None
+
+    # Índice (tipo, ano, Data Base) -> PU, reconstruído só quando a versão dos dados muda
+    @st.cache_data
+    def load_indice_pu(_df, versao):
+        falha_cache("load_indice_pu")
+        return construir_indice_pu(_df)
 
-    df = load_data(TESOURO_URL)
+    @st.cache_data(ttl=TESOURO_IDADE_MAXIMA, show_spinner=False)
+    def load_comparacao(_atuais, _indice, data_base, versao):
+        falha_cache("load_comparacao")
+        return comparar_com_d1(_atuais, _indice, data_base)
+
+    try:
+        with consulta_cache("load_data"):
+            df = load_data(TESOURO_URL)
+    except Exception as e:
+        st.error(f"Erro ao carregar os dados: {e}")
+        df = None
 
     if df is not None:
         required_columns = ["Data Base", "Tipo Titulo", "PU Base Manha", "Data Vencimento"]
         if all(col in df.columns for col in required_columns):
-            df["Data Base"] = pd.to_datetime(df["Data Base"], format="%d/%m/%Y", errors='coerce')
-            df["Data Vencimento"] = pd.to_datetime(df["Data Vencimento"], format="%d/%m/%Y", errors='coerce')
-            df = df.dropna(subset=["Data Base", "Data Vencimento"])
-            if isinstance(df["PU Base Manha"].iloc[0], str):
-                df["PU Base Manha"] = df["PU Base Manha"].str.replace(',', '.').astype(float)
-            else:
-                df["PU Base Manha"] = pd.to_numeric(df["PU Base Manha"], errors="coerce")
-            df = df.dropna(subset=["PU Base Manha"])
-            df["Ano Vencimento"] = df["Data Vencimento"].dt.year
-            df = df.sort_values(by="Data Base")
             data_recente = df["Data Base"].max()
+            with consulta_cache("load_indice_pu"):
+                indice_pu = load_indice_pu(df, (TESOURO_URL, data_recente, len(df)))
             st.write(f"Última data de comparação: **{data_recente.strftime('%d/%m/%Y')}**")
-            tipos = {'SELIC': 'SELIC', 'PREFIXADO': 'Prefixado', 'IPCA': 'IPCA'}
-            for nome, df_atual in titulos_atuais.items():
+            # Todos os grupos comparados de uma vez; sem correspondência no histórico fica NaN.
+            # Refeita só quando muda o snapshot ou a Data Base
+            with consulta_cache("load_comparacao"):
+                comparacao = load_comparacao(titulos_atuais, indice_pu, data_recente, (mercado["versao"], data_recente))
+            for nome in titulos_atuais:
                 st.write(f"**Comparação {nome}**")
-                comparacoes = []
-                for idx, row in df_atual.iterrows():
-                    titulo_api = str(row["Título"])
-                    partes = titulo_api.split()
-                    if len(partes) < 2:
-                        continue
-                    # Extrai o ano (última parte numérica de 4 dígitos)
-                    ano_api = None
-                    for p in partes[::-1]:
-                        if p.isdigit() and len(p) == 4:
-                            ano_api = int(p)
-                            break
-                    if ano_api is None:
-                        continue
-                    # Extrai o tipo do título (tudo menos o ano)
-                    tipo_titulo_api = titulo_api.replace(str(ano_api), '').strip()
-                    # Filtra o CSV por tipo de título exato e ano
-                    filtro = (
-                        (df["Tipo Titulo"].str.strip().str.lower() == tipo_titulo_api.lower()) &
-                        (df["Ano Vencimento"] == ano_api) &
-                        (df["Data Base"] == data_recente)
-                    )
-                    df_match = df[filtro]
-                    pu_api = row["Preço R$ (Compra)"]
-                    if not df_match.empty:
-                        pu_csv = df_match.iloc[0]["PU Base Manha"]
-                        variacao = ((pu_api - pu_csv) / pu_csv) * 100
-                        comparacoes.append({
-                            "Título": row["Título"],
-                            f"Valor D-1: {data_recente.strftime('%d/%m/%Y')}": pu_csv,
-                            "Valor Agora": pu_api,                            
-                            "Variação (%)": round(variacao, 2)
-                        })
-                    else:
-                        comparacoes.append({
-                            "Título": row["Título"],
-                            f"Valor D-1: {data_recente.strftime('%d/%m/%Y')}": "Não localizado",
-                            "Valor Agora": pu_api,                            
-                            "Variação (%)": "Não localizado"
-                        })
-                if comparacoes:
-                    df_comp = pd.DataFrame(comparacoes)
-                    def color_variation(val):
-                        if isinstance(val, (int, float)) and val > 0:
-                            return 'background-color: #d4edda; color: #155724;'
-                        elif isinstance(val, (int, float)) and val < 0:
-                            return 'background-color: #f8d7da; color: #721c24;'
-                        else:
-                            return ''
-                    styled_comp = df_comp.style.applymap(color_variation, subset=["Variação (%)"])
+                df_comp = comparacao[comparacao["Grupo"] == nome].drop(columns="Grupo")
+                if not df_comp.empty:
+                    styled_comp = colorir_por_referencia(df_comp, ["Variação (%)"])
                     st.dataframe(styled_comp, hide_index=True, use_container_width=True)
                 else:
                     st.write("Sem dados para comparação.")
         else:
             st.error(f"O arquivo deve conter as colunas: {', '.join(required_columns)}")
     else:
-        st.error("Não foi possível carregar os dados.")
\ No newline at end of file
+        st.error("Não foi possível carregar os dados.")
+
+# Escolha de família e datas: só o gráfico é refeito, a matriz de curvas vem do cache
+@st.fragment
+def curva_de_juros(curvas):
+    familia = st.selectbox("Família", list(curvas.columns.get_level_values("familia").unique()))
+    datas_curva = curvas.index
+    col1, col2 = st.columns(2)
+    data_curva = col1.date_input("Data", value=datas_curva[-1], min_value=datas_curva[0], max_value=datas_curva[-1])
+    data_comparacao = col2.date_input(
+        "Comparar com", value=max(datas_curva[-1] - pd.DateOffset(months=1), datas_curva[0]),
+        min_value=datas_curva[0], max_value=datas_curva[-1],
+    )
+    # Cada curva é só uma linha da matriz
+    grafico = pd.DataFrame({
+        pd.Timestamp(d).strftime('%d/%m/%Y'): curva_do_dia(curvas, familia, d) for d in (data_curva, data_comparacao)
+    })
+    grafico.index.name = "Prazo (anos)"
+    st.line_chart(grafico)
+
+
+with tab3, medir("aba:curva_de_juros"):
+    st.subheader("Curva de Juros")
+
+    # Matriz (datas x prazos) de todas as famílias; refeita só quando chega uma nova Data Base
+    @st.cache_data(ttl=TESOURO_IDADE_MAXIMA)
+    def load_curvas(versao):
+        falha_cache("load_curvas")
+        return carregar_curvas()
+
+    with consulta_cache("load_curvas"):
+        curvas = load_curvas(ultima_data_armazem())
+    if not curvas.empty:
+        curva_de_juros(curvas)
+    else:
+        st.write("Sem dados históricos para montar a curva.")
+
+with tab4, medir("aba:estatisticas"):
+    st.subheader("Estatísticas por Título")
+
+    # Só as datas novas são processadas; o app lê apenas o resumo já calculado
+    @st.cache_data(ttl=TESOURO_IDADE_MAXIMA)
+    def load_estatisticas(versao):
+        falha_cache("load_estatisticas")
+        atualizar_estatisticas()
+        return ler_resumo_estatisticas()
+
+    with consulta_cache("load_estatisticas"):
+        resumo = load_estatisticas(ultima_data_armazem())
+    if not resumo.empty:
+        st.caption(f"Data Base: {resumo['Data Base'].max().strftime('%d/%m/%Y')} · "
+                   f"volatilidade anualizada de {JANELA_VOLATILIDADE} pregões")
+        st.dataframe(
+            resumo[["Título", "PU Base Manha", "Retorno", "Volatilidade", "Max Drawdown", "Spread Taxa", "Spread PU"]]
+            .style.format({
+                "PU Base Manha": "{:.2f}", "Retorno": "{:.3%}", "Volatilidade": "{:.2%}",
+                "Max Drawdown": "{:.2%}", "Spread Taxa": "{:.2f}", "Spread PU": "{:.2f}",
+            }, na_rep="-"),
+            hide_index=True, use_container_width=True,
+        )
+    else:
+        st.write("Sem dados históricos para calcular as estatísticas.")
+
+# Painel de tempos, caches e bytes (com ?diagnostico=1 na URL)
+painel_diagnostico()
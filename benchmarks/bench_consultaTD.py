@@ -0,0 +1,127 @@
+"""
+Micro-benchmark: consultaTD original (laço por índice) x tabela vetorizada.
+
+Uso:
+    python benchmarks/bench_consultaTD.py [--arquivo treasurybondsinfo.json] [--titulos 2000]
+
+Sem --arquivo, gera um payload sintético com o mesmo formato da API.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_tesouro import consultaTD, consultaTD_grupos, decodificar_json, orjson  # noqa: E402
+
+
+# Implementação original de consultaTD, mantida aqui apenas como referência
+def consultaTD_original(op, tp, resp_dict):
+    n_titulos = len(resp_dict['response']['TrsrBdTradgList'])
+
+    tipos = []
+    nomes = []
+    tx_compras = []
+    tx_vendas = []
+    p_compras = []
+    p_vendas = []
+    vencimentos = []
+
+    for i in range(n_titulos):
+        tipos.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['FinIndxs']['nm'])
+        nomes.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['nm'])
+        vencimentos.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['mtrtyDt'])
+        tx_compras.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['anulInvstmtRate'])
+        p_compras.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['untrInvstmtVal'])
+        tx_vendas.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['anulRedRate'])
+        p_vendas.append(resp_dict['response']['TrsrBdTradgList'][i]['TrsrBd']['untrRedVal'])
+
+    df = pd.DataFrame()
+    df['Tipo'] = tipos
+    df['Título'] = nomes
+    df['Vencimento'] = pd.to_datetime(vencimentos)
+    df['Rentabilidade (Compra)'] = tx_compras
+    df['Preço R$ (Compra)'] = p_compras
+    df['Rentabilidade (Venda)'] = tx_vendas
+    df['Preço R$ (Venda)'] = p_vendas
+
+    if tp == 'S':
+        df = df.iloc[df[df['Tipo'] == 'SELIC'].index]
+    elif tp == 'P':
+        df = df.iloc[df[df['Tipo'] == 'PREFIXADO'].index]
+    elif tp == 'I':
+        df = df.iloc[df[df['Tipo'] == 'IPCA'].index]
+
+    if op == 'C':
+        return df[df['Preço R$ (Compra)'] != 0].drop(df.columns[[5, 6]], axis=1)
+    elif op == 'V':
+        return df.drop(df.columns[[3, 4]], axis=1)
+    else:
+        return df
+
+
+# Payload sintético no formato do treasurybondsinfo.json
+def payload_sintetico(n_titulos):
+    tipos = [('SELIC', 'Tesouro Selic'), ('PREFIXADO', 'Tesouro Prefixado'), ('IPCA', 'Tesouro IPCA+')]
+    lista = []
+    for i in range(n_titulos):
+        tipo, nome = tipos[i % len(tipos)]
+        ano = 2025 + i % 40
+        lista.append({'TrsrBd': {
+            'cd': i,
+            'nm': f'{nome} {ano}',
+            'mtrtyDt': f'{ano}-01-01T00:00:00',
+            'anulInvstmtRate': 6 + (i % 800) / 100,
+            'untrInvstmtVal': 0.0 if i % 7 == 0 else 1000 + i * 1.5,
+            'anulRedRate': 6.1 + (i % 800) / 100,
+            'untrRedVal': 990 + i * 1.5,
+            'FinIndxs': {'cd': i % 3, 'nm': tipo},
+        }})
+    return {'response': {
+        'TrsrBondMkt': {'opngDtTm': '2024-05-10T09:25:00', 'clsgDtTm': '2024-05-11T05:00:00', 'sts': 'Aberto'},
+        'TrsrBdTradgList': lista,
+    }}
+
+
+def medir(func, repeticoes):
+    tempos = timeit.repeat(func, number=1, repeat=repeticoes)
+    return min(tempos) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--arquivo', help='treasurybondsinfo.json salvo')
+    parser.add_argument('--titulos', type=int, default=2000, help='nº de títulos do payload sintético')
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.arquivo:
+        with open(args.arquivo, 'rb') as f:
+            bruto = f.read()
+    else:
+        bruto = json.dumps(payload_sintetico(args.titulos)).encode()
+    snapshot = json.loads(bruto)
+    n = len(snapshot['response']['TrsrBdTradgList'])
+
+    resultados = {
+        'json.loads': medir(lambda: decodificar_json(bruto, 'json'), args.repeticoes),
+        "consultaTD_original('C', tp) x3": medir(
+            lambda: [consultaTD_original('C', tp, snapshot) for tp in 'SPI'], args.repeticoes),
+        "consultaTD('C', tp) x3": medir(
+            lambda: [consultaTD('C', tp, snapshot) for tp in 'SPI'], args.repeticoes),
+        "consultaTD_grupos('C')": medir(lambda: consultaTD_grupos('C', snapshot), args.repeticoes),
+    }
+    if orjson is not None:
+        resultados['orjson.loads'] = medir(lambda: decodificar_json(bruto, 'orjson'), args.repeticoes)
+
+    print(f'{n} títulos, melhor de {args.repeticoes} execuções')
+    for nome, ms in resultados.items():
+        print(f'{nome:<36} {ms:9.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""
+Suíte de benchmarks dos caminhos críticos, sobre fixtures locais (sem rede).
+
+Mede:
+    json       treasurybondsinfo.json -> DataFrame (decodificação + consultaTD_grupos)
+    csv        leitura e conversão do PrecoTaxaTesouroDireto.csv (carregar_historico)
+    d1         comparação com o D-1 (construir_indice_pu + comparar_com_d1)
+    styler     renderização das tabelas coloridas (colorir_por_referencia + to_html)
+    excel      exportação para xlsx pelo exportar_csv do app_prod (leitura do CSV, diferenças e escrita)
+    precificacao  PU, duration e convexidade de todos os títulos x CENARIOS_PRECO taxas
+
+Uso:
+    python benchmarks/bench_suite.py [--escalas 1000000 10000000] [--saida resultados.json]
+    python benchmarks/bench_suite.py --comparar anterior.json [--limite 1.2]
+
+Fixtures, em benchmarks/fixtures/:
+    treasurybondsinfo.json       resposta gravada da API; se não existir, é gerada
+                                 uma sintética com o mesmo formato
+    PrecoTaxaTesouroDireto.csv   CSV real usado como semente; se não existir, é
+                                 gerada uma semente sintética
+O CSV semente é replicado (com as datas deslocadas para trás) até cada escala e
+o resultado fica guardado na mesma pasta para as próximas execuções.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api_tesouro import consultaTD_grupos, decodificar_json, tabela_titulos  # noqa: E402
+from historico_tesouro import carregar_historico, FORMATO_DATA  # noqa: E402
+from comparacao_tesouro import construir_indice_pu, comparar_com_d1, colorir_por_referencia  # noqa: E402
+from exportacao import exportar_csv  # noqa: E402
+from precificacao_tesouro import fluxos_da_tabela, sensibilidades  # noqa: E402
+from bench_consultaTD import payload_sintetico  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+JSON_FIXTURE = os.path.join(FIXTURES_DIR, "treasurybondsinfo.json")
+CSV_SEMENTE = os.path.join(FIXTURES_DIR, "PrecoTaxaTesouroDireto.csv")
+
+ESCALAS_PADRAO = (1_000_000, 10_000_000)
+LINHAS_SEMENTE = 200_000
+CENARIOS_PRECO = 10_000
+COLUNAS_TABELA = ["Título", "Rentabilidade (Compra)", "Preço R$ (Compra)"]
+TIPOS_SEMENTE = [
+    "Tesouro Selic", "Tesouro Prefixado", "Tesouro Prefixado com Juros Semestrais",
+    "Tesouro IPCA+", "Tesouro IPCA+ com Juros Semestrais", "Tesouro IGPM+ com Juros Semestrais",
+]
+
+
+# === Fixtures ===
+
+def fixture_json(caminho=JSON_FIXTURE):
+    if not os.path.exists(caminho):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(payload_sintetico(60), f)
+    with open(caminho, "rb") as f:
+        return f.read()
+
+
+# Semente sintética no formato do PrecoTaxaTesouroDireto.csv
+def _gerar_semente(caminho, linhas=LINHAS_SEMENTE, seed=0):
+    rng = np.random.default_rng(seed)
+    por_dia = 40
+    datas = pd.bdate_range(end="2024-05-10", periods=linhas // por_dia)
+    base = np.repeat(datas.to_numpy(), por_dia)
+    tipos = np.tile(np.arange(por_dia) % len(TIPOS_SEMENTE), len(datas))
+    anos = np.tile(2025 + np.arange(por_dia) % 30, len(datas))
+    df = pd.DataFrame({
+        "Tipo Titulo": np.array(TIPOS_SEMENTE)[tipos],
+        "Data Vencimento": pd.to_datetime({"year": anos, "month": 1, "day": 1}).dt.strftime(FORMATO_DATA),
+        "Data Base": pd.DatetimeIndex(base).strftime(FORMATO_DATA),
+        "Taxa Compra Manha": rng.uniform(4, 14, len(base)).round(2),
+        "Taxa Venda Manha": rng.uniform(4, 14, len(base)).round(2),
+        "PU Compra Manha": rng.uniform(500, 15000, len(base)).round(2),
+        "PU Venda Manha": rng.uniform(500, 15000, len(base)).round(2),
+        "PU Base Manha": rng.uniform(500, 15000, len(base)).round(2),
+    })
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    df.to_csv(caminho, sep=";", decimal=",", index=False, encoding="latin1")
+
+
+# Replica a semente até `linhas`, deslocando as datas de cada cópia para trás
+def fixture_csv(linhas, semente=CSV_SEMENTE):
+    if not os.path.exists(semente):
+        _gerar_semente(semente)
+    destino = os.path.join(FIXTURES_DIR, f"PrecoTaxaTesouroDireto-{linhas}.csv")
+    if os.path.exists(destino) and os.path.getmtime(destino) >= os.path.getmtime(semente):
+        return destino
+
+    original = pd.read_csv(semente, sep=";", encoding="latin1", dtype=str)
+    datas = {c: pd.to_datetime(original[c], format=FORMATO_DATA, errors="coerce") for c in ("Data Base", "Data Vencimento")}
+    deslocamento = (datas["Data Base"].max() - datas["Data Base"].min()) + pd.Timedelta(days=1)
+    temporario = destino + ".tmp"
+    escritas = 0
+    with open(temporario, "w", encoding="latin1", newline="") as f:
+        copia = 0
+        while escritas < linhas:
+            parte = original.head(linhas - escritas).copy()
+            for coluna, valores in datas.items():
+                parte[coluna] = (valores.head(len(parte)) - copia * deslocamento).dt.strftime(FORMATO_DATA)
+            parte.to_csv(f, sep=";", index=False, header=copia == 0)
+            escritas += len(parte)
+            copia += 1
+    os.replace(temporario, destino)
+    return destino
+
+
+# === Medição ===
+
+def medir(func, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def registro(nome, linhas, tempos, **extra):
+    return dict({
+        "nome": nome,
+        "linhas": linhas,
+        "melhor_s": min(tempos),
+        "mediana_s": statistics.median(tempos),
+        "execucoes_s": tempos,
+    }, **extra)
+
+
+def executar(escalas, repeticoes, repeticoes_leves, linhas_excel, engine, arquivo_json=JSON_FIXTURE):
+    resultados = []
+    bruto = fixture_json(arquivo_json)
+    snapshot = decodificar_json(bruto)
+    n_titulos = len(snapshot["response"]["TrsrBdTradgList"])
+
+    tempos = medir(lambda: consultaTD_grupos("C", decodificar_json(bruto)), repeticoes_leves)
+    resultados.append(registro("json", n_titulos, tempos))
+    grupos = consultaTD_grupos("C", snapshot)
+    atuais = {nome: df[COLUNAS_TABELA] for nome, df in grupos.items()}
+
+    fluxos = fluxos_da_tabela(tabela_titulos(snapshot))
+    cenarios = np.linspace(0.0, 20.0, CENARIOS_PRECO)
+    tempos = medir(lambda: sensibilidades(fluxos, cenarios), repeticoes_leves)
+    resultados.append(registro("precificacao", n_titulos, tempos, cenarios=CENARIOS_PRECO))
+
+    for linhas in escalas:
+        caminho = fixture_csv(linhas)
+        tempos = medir(lambda: carregar_historico(caminho, engine=engine), repeticoes)
+        df = carregar_historico(caminho, engine=engine)
+        resultados.append(registro("csv", len(df), tempos, engine=engine or "c"))
+
+        data_base = df["Data Base"].max()
+        tempos = medir(lambda: comparar_com_d1(atuais, construir_indice_pu(df), data_base), repeticoes)
+        resultados.append(registro("d1", len(df), tempos))
+
+        comparacao = comparar_com_d1(atuais, construir_indice_pu(df), data_base)
+        tabelas = [colorir_por_referencia(comparacao, ["Variação (%)"])]
+        tabelas += [colorir_por_referencia(t, ["Rentabilidade (Compra)"], 10.0) for t in atuais.values()]
+        tempos = medir(lambda: [t.to_html() for t in tabelas], repeticoes_leves)
+        resultados.append(registro("styler", sum(len(t.data) for t in tabelas), tempos, escala=len(df)))
+
+        amostra = df.head(linhas_excel)
+        conteudo = amostra.to_csv(index=False).encode("utf-8")
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, "planilha.xlsx")
+            # forcar: regrava a cada repetição em vez de parar no hash igual
+            tempos = medir(lambda: exportar_csv(conteudo, saida, forcar=True), repeticoes)
+        resultados.append(registro("excel", len(amostra), tempos, escala=len(df)))
+        del df
+    return resultados
+
+
+# Razão entre a execução atual e uma anterior, pelo melhor tempo de cada medida
+def comparar(atual, anterior, limite):
+    chave = lambda r: (r["nome"], r.get("escala", r["linhas"]))  # noqa: E731
+    antes = {chave(r): r for r in anterior["resultados"]}
+    regressoes = []
+    for r in atual["resultados"]:
+        base = antes.get(chave(r))
+        if base is None:
+            continue
+        razao = r["melhor_s"] / base["melhor_s"] if base["melhor_s"] else float("inf")
+        marca = "  <-- regressão" if razao > limite else ""
+        print(f"{r['nome']:<8} {chave(r)[1]:>10} {base['melhor_s']:10.4f}s -> {r['melhor_s']:10.4f}s  x{razao:5.2f}{marca}")
+        if marca:
+            regressoes.append(r["nome"])
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", type=int, nargs="+", default=list(ESCALAS_PADRAO), help="linhas do CSV escalado")
+    parser.add_argument("--repeticoes", type=int, default=3, help="execuções das medidas pesadas")
+    parser.add_argument("--repeticoes-leves", type=int, default=20, help="execuções de json e styler")
+    parser.add_argument("--linhas-excel", type=int, default=100_000, help="linhas exportadas para xlsx")
+    parser.add_argument("--engine", default="pyarrow", help="engine do read_csv ('c' ou 'pyarrow')")
+    parser.add_argument("--json", default=JSON_FIXTURE, help="treasurybondsinfo.json gravado")
+    parser.add_argument("--saida", default="bench_resultados.json", help="arquivo JSON de resultados")
+    parser.add_argument("--comparar", help="resultados de uma execução anterior")
+    parser.add_argument("--limite", type=float, default=1.2, help="razão a partir da qual há regressão")
+    args = parser.parse_args()
+
+    resultados = executar(args.escalas, args.repeticoes, args.repeticoes_leves, args.linhas_excel, args.engine, args.json)
+    saida = {
+        "gerado_em": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "ambiente": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "processador": platform.processor() or platform.machine(),
+        },
+        "resultados": resultados,
+    }
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(saida, f, ensure_ascii=False, indent=2)
+
+    for r in resultados:
+        print(f"{r['nome']:<12} {r['linhas']:>10} linhas  melhor {r['melhor_s']:9.4f}s  mediana {r['mediana_s']:9.4f}s")
+    print(f"Resultados gravados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+        if comparar(saida, anterior, args.limite):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
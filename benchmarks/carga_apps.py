@@ -0,0 +1,256 @@
+"""
+Teste de carga: N sessões simultâneas do app_tesouro ou do app_prod (AppTest),
+com o HTTP servido pelas gravações do transporte.py (sem acessar a rede).
+
+Uso:
+    python benchmarks/carga_apps.py --app tesouro --sessoes 20 --reruns 30 --latencia 0.2
+    python benchmarks/carga_apps.py --app tesouro \\
+        --fixture https://.../treasurybondsinfo.json=benchmarks/fixtures/treasurybondsinfo.json
+
+Modos:
+    stub         (padrão) sobe o servidor stub local e redireciona todo o HTTP para ele
+    reproduzir   responde direto das gravações, sem socket
+--fixture URL=arquivo grava o arquivo como resposta da URL antes de começar.
+
+Relata reruns/s e a latência de rerun (p50/p99/máx) e grava tudo em JSON.
+Rode a partir da raiz do projeto (os apps usam caminhos relativos).
+
+Com --processos 1 (padrão) todas as sessões são threads de um só processo e
+compartilham os caches, como em um único servidor Streamlit. O AppTest não foi
+feito para rodar em paralelo (troca globais do Streamlit a cada execução), o
+que pode gerar avisos de "runtime"; com --processos P as sessões são
+divididas entre P processos, como P réplicas do servidor.
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from email.utils import formatdate
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from streamlit import config  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import metricas  # noqa: E402
+from transporte import GRAVACOES_DIR, configurar, gravar_resposta, iniciar_stub  # noqa: E402
+
+APPS = {"tesouro": "app_tesouro.py", "prod": "app_prod.py"}
+# Secrets mínimos para o app_prod rodar sem o secrets.toml
+SECRETS_PROD = {
+    "users": {"carga": {"email": "carga@localhost", "password": "carga", "admin": False}},
+    "email": {"EMAIL_ADDRESS": "carga@localhost", "EMAIL_PASSWORD": "", "SMTP_SERVER": "localhost", "SMTP_PORT": "25"},
+    "sheet_config": {"sheet_id": "carga", "sheet_name": "carga", "file_name": "carga.xlsx", "download_folder": "downloads"},
+}
+
+
+# Grava um arquivo local como resposta 200 da URL
+def semear_fixture(diretorio, url, caminho):
+    with open(caminho, "rb") as f:
+        corpo = f.read()
+    cabecalhos = {
+        "ETag": '"' + hashlib.sha256(corpo).hexdigest()[:32] + '"',
+        "Last-Modified": formatdate(os.path.getmtime(caminho), usegmt=True),
+        "Content-Type": "application/json" if caminho.endswith(".json") else "text/csv",
+    }
+    gravar_resposta(diretorio, url, 200, cabecalhos, corpo)
+
+
+def _quantil(ordenadas, q):
+    return ordenadas[min(int(q * len(ordenadas)), len(ordenadas) - 1)] if ordenadas else None
+
+
+def _valor_toml(valor):
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    if isinstance(valor, (int, float)):
+        return str(valor)
+    return json.dumps(str(valor), ensure_ascii=False)
+
+
+def _gravar_secrets_toml(secrets, caminho):
+    linhas = []
+
+    def secao(nome, valores):
+        simples = {k: v for k, v in valores.items() if not isinstance(v, dict)}
+        linhas.append(f"[{nome}]")
+        linhas.extend(f"{k} = {_valor_toml(v)}" for k, v in simples.items())
+        for k, v in valores.items():
+            if isinstance(v, dict):
+                secao(f"{nome}.{k}", v)
+
+    for nome, valores in secrets.items():
+        secao(nome, valores)
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("\n".join(linhas) + "\n")
+
+
+# O AppTest.secrets troca st.secrets a cada execução, o que não é seguro entre
+# threads; os secrets vão para um secrets.toml lido uma vez por processo
+def _configurar_processo(transporte, secrets):
+    configurar(**transporte)
+    if secrets:
+        caminho = os.path.join(tempfile.mkdtemp(prefix="carga-"), "secrets.toml")
+        _gravar_secrets_toml(secrets, caminho)
+        config.set_option("secrets.files", [caminho])
+
+
+def _nova_sessao(app, timeout, secrets):
+    at = AppTest.from_file(os.path.join(RAIZ, APPS[app]), default_timeout=timeout)
+    if app == "prod":
+        usuario = next(iter(secrets["users"].values()))
+        at.session_state["user"] = {"email": usuario["email"], "admin": bool(usuario.get("admin"))}
+    return at
+
+
+# Uma sessão: primeira execução e depois `reruns` interações
+def _rodar_sessao(indice, app, reruns, timeout, secrets, barreira, latencias, erros):
+    try:
+        at = _nova_sessao(app, timeout, secrets)
+    except Exception as e:
+        erros.append(f"sessão {indice}: {e}")
+        barreira.abort()
+        return
+    try:
+        barreira.wait()
+    except threading.BrokenBarrierError:
+        # Outra sessão falhou ao iniciar e abortou a barreira
+        erros.append(f"sessão {indice}: barreira abortada")
+        return
+    for rerun in range(reruns + 1):
+        inicio = time.perf_counter()
+        try:
+            # Como um usuário mexendo na taxa de referência; sem campos, só reexecuta
+            if rerun and at.number_input:
+                campo = at.number_input[0]
+                campo.set_value(round(campo.value + (0.01 if rerun % 2 else -0.01), 2)).run()
+            else:
+                at.run()
+        except Exception as e:
+            erros.append(f"sessão {indice}, rerun {rerun}: {e}")
+            continue
+        latencias.append((rerun, time.perf_counter() - inicio))
+        if at.exception:
+            erros.append(f"sessão {indice}, rerun {rerun}: {at.exception[0].message}")
+
+
+# Sessões em threads de um único processo; retorna as latências (rerun, duração) e os erros
+def _executar_processo(app, sessoes, reruns, timeout, secrets):
+    latencias, erros = [], []
+    barreira = threading.Barrier(sessoes)
+    threads = [
+        threading.Thread(target=_rodar_sessao, args=(i, app, reruns, timeout, secrets, barreira, latencias, erros),
+                         name=f"sessao-{i}")
+        for i in range(sessoes)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencias, erros, metricas.instantaneo()
+
+
+def executar(app, sessoes, reruns, timeout=120, secrets=None, processos=1, transporte=None):
+    """
+    transporte: argumentos de transporte.configurar() para cada processo
+    Retorna um dict com reruns/s, latências e erros.
+    """
+    secrets = secrets or SECRETS_PROD
+    transporte = transporte or {}
+    processos = max(1, min(processos, sessoes))
+    divisao = [sessoes // processos + (i < sessoes % processos) for i in range(processos)]
+
+    inicio = time.perf_counter()
+    if processos == 1:
+        _configurar_processo(transporte, secrets if app == "prod" else None)
+        partes = [_executar_processo(app, sessoes, reruns, timeout, secrets)]
+    else:
+        with ProcessPoolExecutor(processos, initializer=_configurar_processo,
+                                 initargs=(transporte, secrets if app == "prod" else None)) as executor:
+            futuros = [executor.submit(_executar_processo, app, n, reruns, timeout, secrets) for n in divisao]
+            partes = [f.result() for f in futuros]
+    duracao = time.perf_counter() - inicio
+
+    latencias = [item for parte in partes for item in parte[0]]
+    erros = [erro for parte in partes for erro in parte[1]]
+    # A primeira execução de cada sessão (carga inicial) é relatada à parte
+    primeiras = sorted(d for r, d in latencias if r == 0)
+    seguintes = sorted(d for r, d in latencias if r > 0)
+    return {
+        "app": app,
+        "sessoes": sessoes,
+        "processos": processos,
+        "reruns_por_sessao": reruns,
+        "execucoes": len(latencias),
+        "duracao_s": duracao,
+        "reruns_por_s": len(latencias) / duracao if duracao else None,
+        "latencia_s": {
+            "p50": _quantil(seguintes, 0.5), "p99": _quantil(seguintes, 0.99),
+            "max": seguintes[-1] if seguintes else None,
+            "media": statistics.fmean(seguintes) if seguintes else None,
+        },
+        "primeira_execucao_s": {"p50": _quantil(primeiras, 0.5), "max": primeiras[-1] if primeiras else None},
+        "erros": erros,
+        "metricas_por_processo": [parte[2] for parte in partes],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", choices=sorted(APPS), default="tesouro")
+    parser.add_argument("--sessoes", type=int, default=10)
+    parser.add_argument("--reruns", type=int, default=20, help="interações por sessão após a primeira execução")
+    parser.add_argument("--modo", choices=("stub", "reproduzir"), default="stub")
+    parser.add_argument("--gravacoes", default=GRAVACOES_DIR, help="pasta das gravações HTTP")
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos por resposta HTTP")
+    parser.add_argument("--fixture", action="append", default=[], metavar="URL=ARQUIVO")
+    parser.add_argument("--secrets", help="JSON com os secrets do app_prod (padrão: valores de teste)")
+    parser.add_argument("--processos", type=int, default=1, help="processos entre os quais as sessões são divididas")
+    parser.add_argument("--timeout", type=float, default=120, help="limite por execução do app, em segundos")
+    parser.add_argument("--saida", default="carga_resultados.json")
+    args = parser.parse_args()
+
+    for item in args.fixture:
+        url, _, caminho = item.rpartition("=")
+        semear_fixture(args.gravacoes, url, caminho)
+
+    servidor = None
+    if args.modo == "stub":
+        servidor, endereco = iniciar_stub(args.gravacoes, latencia=args.latencia)
+        transporte = {"modo": "stub", "stub": endereco}
+    else:
+        transporte = {"modo": "reproduzir", "diretorio": args.gravacoes, "latencia": args.latencia}
+
+    secrets = None
+    if args.secrets:
+        with open(args.secrets, "r", encoding="utf-8") as f:
+            secrets = json.load(f)
+    try:
+        resultado = executar(args.app, args.sessoes, args.reruns, args.timeout, secrets, args.processos, transporte)
+    finally:
+        if servidor is not None:
+            servidor.shutdown()
+    resultado.update(modo=args.modo, latencia_http_s=args.latencia)
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    lat = resultado["latencia_s"]
+    print(f"{resultado['sessoes']} sessões em {resultado['processos']} processo(s) x {resultado['reruns_por_sessao']} reruns: "
+          f"{resultado['execucoes']} execuções em {resultado['duracao_s']:.1f}s "
+          f"({resultado['reruns_por_s']:.1f} reruns/s)")
+    if lat["p50"] is not None:
+        print(f"rerun p50 {lat['p50'] * 1000:.0f} ms  p99 {lat['p99'] * 1000:.0f} ms  máx {lat['max'] * 1000:.0f} ms")
+    for erro in resultado["erros"][:10]:
+        print(f"erro: {erro}")
+    print(f"Resultados gravados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
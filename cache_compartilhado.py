@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from metricas import registrar_cache
+
+# Trava de arquivo do sistema operacional: flock no Linux/macOS, msvcrt no Windows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Intervalo entre tentativas de obter a trava quando há tempo limite
+INTERVALO_TRAVA = 0.05
+
+ResultadoCache = namedtuple("ResultadoCache", ["caminho", "valor", "do_cache"])
+
+_travas_locais = {}
+_travas_locais_lock = threading.Lock()
+_local = threading.local()
+
+
+def _caminho_trava(caminho):
+    return caminho + ".lock"
+
+
+def _caminho_marca(caminho):
+    return caminho + ".cache.json"
+
+
+def _tentar_travar(fd, bloquear):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX | (0 if bloquear else fcntl.LOCK_NB))
+    else:
+        # msvcrt trava bytes a partir da posição atual; usa sempre o primeiro byte
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+
+def _destravar(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+# Trava exclusiva de um recurso, válida entre threads e entre processos do mesmo host
+@contextmanager
+def trava_recurso(caminho, timeout=None):
+    """
+    Usa o arquivo <caminho>.lock. É reentrante na mesma thread.
+    timeout: segundos de espera (None espera indefinidamente); estourado, gera TimeoutError
+    """
+    caminho = os.path.abspath(caminho)
+    seguras = getattr(_local, "travas", None)
+    if seguras is None:
+        seguras = _local.travas = {}
+    if caminho in seguras:
+        seguras[caminho] += 1
+        try:
+            yield
+        finally:
+            seguras[caminho] -= 1
+        return
+
+    with _travas_locais_lock:
+        local = _travas_locais.setdefault(caminho, threading.Lock())
+    if not local.acquire(timeout=-1 if timeout is None else timeout):
+        raise TimeoutError(f"Tempo limite esperando a trava de {caminho}")
+    try:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        fd = os.open(_caminho_trava(caminho), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            limite = None if timeout is None else time.monotonic() + timeout
+            while True:
+                try:
+                    _tentar_travar(fd, bloquear=limite is None and fcntl is not None)
+                    break
+                except OSError:
+                    if limite is not None and time.monotonic() >= limite:
+                        raise TimeoutError(f"Tempo limite esperando a trava de {caminho}")
+                    time.sleep(INTERVALO_TRAVA)
+            seguras[caminho] = 1
+            try:
+                yield
+            finally:
+                del seguras[caminho]
+                _destravar(fd)
+        finally:
+            os.close(fd)
+    finally:
+        local.release()
+
+
+def atualizado_em(caminho):
+    try:
+        with open(_caminho_marca(caminho), "r", encoding="utf-8") as f:
+            return json.load(f).get("atualizado_em")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _marcar_atualizado(caminho, quando):
+    destino = _caminho_marca(caminho)
+    temporario = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump({"atualizado_em": quando}, f)
+    os.replace(temporario, destino)
+
+
+def _fresco(caminho, idade_maxima, agora):
+    quando = atualizado_em(caminho)
+    return quando is not None and os.path.exists(caminho) and agora - quando < idade_maxima
+
+
+# Arquivo compartilhado por todas as sessões e processos: um único produtor por vez
+def obter_compartilhado(caminho, produzir, idade_maxima=0, forcar=False, timeout=None, nome=None):
+    """
+    produzir(): atualiza o arquivo em caminho (gravando de forma atômica) e
+                retorna um valor qualquer (ex.: ResultadoDownload)
+    idade_maxima: segundos em que a última atualização é reaproveitada sem produzir de novo
+    forcar: ignora a idade, mas ainda aproveita uma atualização que terminou
+            enquanto esta chamada esperava a trava
+    Pedidos simultâneos do mesmo recurso esperam a trava e usam o resultado de
+    quem chegou primeiro (single-flight). Retorna um ResultadoCache; quando veio
+    do cache, valor é None.
+    """
+    nome = nome or os.path.basename(caminho)
+    pedido_em = time.time()
+    if not forcar and _fresco(caminho, idade_maxima, pedido_em):
+        registrar_cache(f"compartilhado:{nome}", True)
+        return ResultadoCache(caminho, None, True)
+
+    with trava_recurso(caminho, timeout):
+        # Alguém atualizou enquanto esperávamos a trava: reaproveita
+        quando = atualizado_em(caminho)
+        if quando is not None and os.path.exists(caminho) and (
+                quando >= pedido_em or (not forcar and time.time() - quando < idade_maxima)):
+            registrar_cache(f"compartilhado:{nome}", True)
+            return ResultadoCache(caminho, None, True)
+        registrar_cache(f"compartilhado:{nome}", False)
+        valor = produzir()
+        _marcar_atualizado(caminho, time.time())
+        return ResultadoCache(caminho, valor, False)
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+# Ano de vencimento: último token de 4 dígitos do título (ex.: "Tesouro IPCA+ 2035")
+_REGEX_ANO = r"(?:^|\s)(\d{4})(?=\s|$)(?!.*(?:^|\s)\d{4}(?:\s|$))"
+
+
+# Normalização usada dos dois lados da comparação (API e CSV)
+def normalizar_tipo(tipos):
+    return tipos.astype(str).str.strip().str.lower()
+
+
+# Separa, de forma vetorizada, o tipo normalizado e o ano de vencimento dos títulos da API
+def separar_tipo_ano(titulos):
+    """
+    titulos: Series com os nomes da API (coluna "Título")
+    Retorna um DataFrame com o mesmo índice e as colunas 'tipo' e 'ano';
+    títulos sem ano ou só com o ano ficam com NaN/<NA>.
+    """
+    titulos = titulos.astype(str)
+    ano = pd.to_numeric(titulos.str.extract(_REGEX_ANO, expand=False), errors="coerce").astype("Int64")
+    tipo = normalizar_tipo(titulos.str.replace(_REGEX_ANO, "", regex=True))
+    tipo = tipo.where(tipo != "")
+    return pd.DataFrame({"tipo": tipo, "ano": ano}, index=titulos.index)
+
+
+# Índice (tipo normalizado, ano de vencimento, Data Base) -> valor, para busca direta
+def construir_indice_pu(df, coluna_valor="PU Base Manha"):
+    """
+    df: histórico com "Tipo Titulo", "Ano Vencimento", "Data Base" e coluna_valor
+    Em chaves repetidas vale a primeira linha, como no filtro original.
+    """
+    chaves = pd.MultiIndex.from_arrays(
+        [normalizar_tipo(df["Tipo Titulo"]), df["Ano Vencimento"].astype("int64"), df["Data Base"]],
+        names=["tipo", "ano", "Data Base"],
+    )
+    indice = pd.Series(df[coluna_valor].to_numpy(), index=chaves)
+    return indice[~indice.index.duplicated(keep="first")]
+
+
+# Tabela de variação de todos os grupos de uma vez: um único merge e aritmética por coluna
+def comparar_com_d1(atuais, indice, data_base, coluna_atual="Preço R$ (Compra)"):
+    """
+    atuais: {grupo: DataFrame com "Título" e coluna_atual} (ou um único DataFrame)
+    indice: saída de construir_indice_pu
+    Retorna um DataFrame com "Grupo", "Título", "Valor D-1: dd/mm/aaaa",
+    "Valor Agora" e "Variação (%)"; as colunas de valor são numéricas e
+    ficam NaN quando o título não é localizado no histórico.
+    Títulos sem tipo ou ano identificável ficam de fora.
+    """
+    data_base = pd.Timestamp(data_base)
+    coluna_d1 = f"Valor D-1: {data_base.strftime('%d/%m/%Y')}"
+    colunas_saida = ["Grupo", "Título", coluna_d1, "Valor Agora", "Variação (%)"]
+    if isinstance(atuais, pd.DataFrame):
+        atuais = {None: atuais}
+    atuais = {grupo: df for grupo, df in atuais.items() if df is not None and not df.empty}
+    if not atuais:
+        return pd.DataFrame(columns=colunas_saida)
+
+    tabela = pd.concat(
+        [df[["Título", coluna_atual]].assign(Grupo=grupo) for grupo, df in atuais.items()], ignore_index=True
+    )
+    tabela = tabela.join(separar_tipo_ano(tabela["Título"])).dropna(subset=["tipo", "ano"])
+
+    # Valores da Data Base pedida, como tabela (tipo, ano) -> valor
+    try:
+        d1 = indice.xs(data_base, level="Data Base")
+    except KeyError:
+        d1 = indice.iloc[:0].droplevel("Data Base")
+    d1 = d1.rename(coluna_d1).reset_index()
+    tabela["ano"] = tabela["ano"].astype("int64")
+
+    tabela = tabela.merge(d1, on=["tipo", "ano"], how="left", validate="many_to_one")
+    tabela = tabela.rename(columns={coluna_atual: "Valor Agora"})
+    tabela[coluna_d1] = tabela[coluna_d1].astype("float64")
+    tabela["Variação (%)"] = ((tabela["Valor Agora"] - tabela[coluna_d1]) / tabela[coluna_d1] * 100).round(2)
+    return tabela[colunas_saida]
+
+
+# Cores das células acima e abaixo da referência
+COR_ACIMA = 'background-color: #d4edda; color: #155724;'  # verde claro
+COR_ABAIXO = 'background-color: #f8d7da; color: #721c24;'  # vermelho claro
+
+
+def _cores_por_referencia(coluna, referencia):
+    valores = pd.to_numeric(coluna, errors="coerce").to_numpy(dtype="float64")
+    return np.select([valores > referencia, valores < referencia], [COR_ACIMA, COR_ABAIXO], default="")
+
+
+# Styler com as colunas coloridas pela comparação com a referência, coluna inteira de uma vez
+def colorir_por_referencia(df, colunas, referencia=0.0):
+    """
+    colunas: colunas a colorir (verde acima da referência, vermelho abaixo)
+    referencia: None desliga a coloração; NaN nunca é colorido
+    Funciona com qualquer DataFrame; não depende do Streamlit.
+    """
+    estilo = df.style
+    if referencia is None:
+        return estilo
+    return estilo.apply(_cores_por_referencia, subset=colunas, referencia=referencia)
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+from comparacao_tesouro import normalizar_tipo, separar_tipo_ano
+from historico_tesouro import ARMAZEM_DIR, DIA_NULO, compactar_historico, datas_para_dias, ler_armazem, preparar_historico
+
+# Separa títulos diferentes na chave combinada (título, dia); dias são sempre menores que isso
+_ESCALA_CHAVE = 1 << 20
+_DIA_MIN = -(_ESCALA_CHAVE // 2)
+_DIA_MAX = _ESCALA_CHAVE // 2 - 1
+
+
+# Datas -> dias, com `padrao` onde não há limite (None/NaT)
+def _dias(datas, padrao):
+    dias = datas_para_dias(pd.to_datetime(pd.Series(list(datas), dtype="object"))).astype("int64")
+    return np.where(dias == DIA_NULO, padrao, dias)
+
+
+# Histórico ordenado por título e "Data Base", com busca binária por intervalo de datas
+class HistoricoTitulos:
+    """
+    df: histórico com "Tipo Titulo", "Ano Vencimento" e "Data Base", no layout
+        padrão ou no compacto (ver historico_tesouro.compactar_historico)
+    colunas: colunas mantidas além das de identificação (None para todas)
+    Os títulos são identificados como na API (ex.: "Tesouro IPCA+ 2035").
+    As consultas devolvem fatias do histórico ordenado, sem copiar os dados:
+    não altere os DataFrames retornados.
+    """
+
+    def __init__(self, df, colunas=None):
+        if colunas is not None:
+            fixas = ["Tipo Titulo", "Ano Vencimento", "Data Base"]
+            df = df[fixas + [c for c in colunas if c not in fixas]]
+        tipo = normalizar_tipo(df["Tipo Titulo"])
+        ano = df["Ano Vencimento"].astype("int64")
+        base = df["Data Base"]
+        dias = base.to_numpy() if pd.api.types.is_integer_dtype(base) else datas_para_dias(base)
+
+        # Códigos dos títulos na ordem (tipo, ano); a ordenação estável mantém a ordem original nos empates
+        chaves = pd.MultiIndex.from_arrays([tipo, ano], names=["tipo", "ano"])
+        codigo, unicos = pd.factorize(chaves, sort=True)
+        self._codigos = pd.Series(np.arange(len(unicos)), index=unicos)
+        chave = codigo.astype("int64") * _ESCALA_CHAVE + (dias.astype("int64") - _DIA_MIN)
+        ordem = np.argsort(chave, kind="stable")
+
+        self._chave = chave[ordem]
+        self._df = df.iloc[ordem].reset_index(drop=True)
+        primeiros = np.searchsorted(self._chave, np.arange(len(unicos)) * _ESCALA_CHAVE)
+        nomes = self._df["Tipo Titulo"].astype(str).to_numpy()[primeiros] if len(self._df) else []
+        self._nomes = [f"{nome} {ano}" for nome, (_, ano) in zip(nomes, unicos)]
+
+    def __len__(self):
+        return len(self._df)
+
+    # Títulos disponíveis, no formato aceito pelas consultas
+    def titulos(self):
+        return list(self._nomes)
+
+    # Posições [início, fim) de vários pedidos de uma vez: duas buscas binárias vetorizadas
+    def intervalos(self, titulos, inicios=None, fins=None):
+        """
+        titulos: sequência de nomes (ex.: "Tesouro IPCA+ 2035")
+        inicios, fins: datas inclusivas alinhadas a titulos (None = sem limite)
+        Retorna dois arrays int64; títulos desconhecidos ficam com intervalo vazio.
+        """
+        titulos = pd.Series(list(titulos), dtype="object")
+        n = len(titulos)
+        inicios = [None] * n if inicios is None else inicios
+        fins = [None] * n if fins is None else fins
+
+        separados = separar_tipo_ano(titulos)
+        chaves = pd.MultiIndex.from_arrays(
+            [separados["tipo"].fillna(""), separados["ano"].fillna(-1).astype("int64")]
+        )
+        codigo = self._codigos.reindex(chaves).to_numpy(dtype="float64")
+        conhecido = ~np.isnan(codigo)
+        codigo = np.where(conhecido, codigo, 0).astype("int64")
+
+        dia_inicio = _dias(inicios, _DIA_MIN)
+        dia_fim = _dias(fins, _DIA_MAX)
+        base = codigo * _ESCALA_CHAVE - _DIA_MIN
+        a = np.searchsorted(self._chave, base + dia_inicio, side="left")
+        b = np.searchsorted(self._chave, base + dia_fim, side="right")
+        b = np.where(conhecido & (b > a), b, a)
+        return a, b
+
+    # Histórico de um título entre duas datas (inclusivas)
+    def consultar(self, titulo, inicio=None, fim=None):
+        return self.consultar_lote([(titulo, inicio, fim)])[0]
+
+    # Vários pedidos (título, início, fim) em uma única chamada, para gráficos e relatórios
+    def consultar_lote(self, pedidos):
+        """
+        pedidos: sequência de (título, início, fim); início/fim podem ser None
+        Retorna uma lista de DataFrames na ordem dos pedidos.
+        """
+        pedidos = list(pedidos)
+        if not pedidos:
+            return []
+        titulos, inicios, fins = zip(*pedidos)
+        a, b = self.intervalos(titulos, inicios, fins)
+        return [self._df.iloc[i:j] for i, j in zip(a, b)]
+
+
+# Índice de consulta sobre o armazenamento local
+def carregar_consulta(colunas=None, inicio=None, fim=None, diretorio=ARMAZEM_DIR, compacto=False):
+    """
+    colunas, inicio, fim: como em ler_armazem(); só o necessário é lido do disco
+    compacto: True para guardar o histórico no layout compacto
+    """
+    leitura = None
+    if colunas is not None:
+        fixas = ["Tipo Titulo", "Data Vencimento", "Data Base"]
+        leitura = fixas + [c for c in colunas if c not in fixas and c != "Ano Vencimento"]
+    df = preparar_historico(ler_armazem(leitura, inicio, fim, diretorio))
+    return HistoricoTitulos(compactar_historico(df) if compacto else df, colunas)
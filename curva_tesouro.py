@@ -0,0 +1,132 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from historico_tesouro import ARMAZEM_DIR, ler_armazem, ultima_data_armazem
+
+# Títulos usados em cada família de curva
+FAMILIAS = {
+    "PREFIXADO": ["Tesouro Prefixado", "Tesouro Prefixado com Juros Semestrais"],
+    "IPCA": ["Tesouro IPCA+", "Tesouro IPCA+ com Juros Semestrais"],
+    "SELIC": ["Tesouro Selic"],
+}
+# Grade padrão de prazos, em anos (dias úteis / 252)
+PRAZOS_PADRAO = (0.5, 1, 2, 3, 5, 7, 10, 15, 20, 30)
+COLUNA_TAXA = "Taxa Compra Manha"
+ARQUIVO_CURVAS = "_curvas.parquet"
+
+# Separa datas diferentes na chave combinada (data, prazo); prazos são sempre menores que isso
+_ESCALA_CHAVE = 1000.0
+
+
+def _familia_por_titulo():
+    return {titulo.lower(): familia for familia, titulos in FAMILIAS.items() for titulo in titulos}
+
+
+# Interpola todas as datas de uma família de uma vez na grade de prazos
+def _interpolar(grupo, prazos):
+    """
+    grupo: linhas de uma família ordenadas por "Data Base" e "prazo"
+    Retorna um DataFrame (datas x prazos); fora do intervalo de prazos
+    negociados naquela data o valor fica NaN (sem extrapolação).
+    """
+    datas, codigo = np.unique(grupo["Data Base"].to_numpy(), return_inverse=True)
+    x = grupo["prazo"].to_numpy()
+    y = grupo["taxa"].to_numpy()
+    prazos = np.asarray(prazos, dtype="float64")
+
+    # Como as linhas estão ordenadas por data e prazo, a chave combinada é crescente
+    chave = codigo * _ESCALA_CHAVE + x
+    codigo_alvo = np.repeat(np.arange(len(datas)), len(prazos))
+    alvo = codigo_alvo * _ESCALA_CHAVE + np.tile(prazos, len(datas))
+
+    n = len(chave)
+    j = np.searchsorted(chave, alvo, side="left")
+    direita = np.minimum(j, n - 1)
+    esquerda = np.maximum(j - 1, 0)
+    tem_direita = (j < n) & (codigo[direita] == codigo_alvo)
+    tem_esquerda = (j > 0) & (codigo[esquerda] == codigo_alvo)
+
+    prazo_alvo = alvo - codigo_alvo * _ESCALA_CHAVE
+    exato = tem_direita & np.isclose(x[direita], prazo_alvo)
+    entre = tem_direita & tem_esquerda & ~exato
+    valores = np.full(len(alvo), np.nan)
+    valores[exato] = y[direita][exato]
+    # Só os pontos entre dois prazos negociados; taxas NaN seguem NaN sem avisos
+    e, d = esquerda[entre], direita[entre]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        peso = (prazo_alvo[entre] - x[e]) / (x[d] - x[e])
+        valores[entre] = y[e] + peso * (y[d] - y[e])
+
+    return pd.DataFrame(
+        valores.reshape(len(datas), len(prazos)),
+        index=pd.DatetimeIndex(datas, name="Data Base"),
+        columns=pd.Index(prazos, name="prazo"),
+    )
+
+
+# Matriz (datas x prazos) de cada família, para todas as "Data Base" em uma única passada
+def construir_curvas(df, coluna_taxa=COLUNA_TAXA, prazos=PRAZOS_PADRAO):
+    """
+    df: histórico com "Tipo Titulo", "Data Base", "Data Vencimento" e coluna_taxa
+    Retorna um DataFrame com índice "Data Base" e colunas MultiIndex (familia, prazo).
+    """
+    familia = df["Tipo Titulo"].astype(str).str.strip().str.lower().map(_familia_por_titulo())
+    base = df["Data Base"].to_numpy().astype("datetime64[D]")
+    vencimento = df["Data Vencimento"].to_numpy().astype("datetime64[D]")
+    dados = pd.DataFrame({
+        "familia": familia.to_numpy(),
+        "Data Base": df["Data Base"].to_numpy(dtype="datetime64[ns]"),
+        "prazo": np.busday_count(base, vencimento) / 252,
+        "taxa": df[coluna_taxa].to_numpy(dtype="float64"),
+    }).dropna()
+    dados = dados[dados["prazo"] > 0]
+    # Títulos da mesma família com o mesmo vencimento na mesma data viram um único ponto
+    dados = dados.groupby(["familia", "Data Base", "prazo"], sort=True)["taxa"].mean().reset_index()
+
+    curvas = {familia: _interpolar(grupo, prazos) for familia, grupo in dados.groupby("familia", sort=False)}
+    if not curvas:
+        return pd.DataFrame()
+    return pd.concat(curvas, axis=1, names=["familia", "prazo"]).sort_index()
+
+
+# Curvas construídas a partir do armazenamento local, guardadas em disco até a próxima atualização
+def carregar_curvas(diretorio=ARMAZEM_DIR, coluna_taxa=COLUNA_TAXA, prazos=PRAZOS_PADRAO):
+    ultima = ultima_data_armazem(diretorio)
+    if ultima is None:
+        return pd.DataFrame()
+    caminho = os.path.join(diretorio, ARQUIVO_CURVAS)
+    versao = {"ultima_data": ultima.strftime("%Y-%m-%d"), "coluna": coluna_taxa, "prazos": list(map(float, prazos))}
+    try:
+        with open(caminho + ".json", "r", encoding="utf-8") as f:
+            if json.load(f) == versao:
+                curvas = pd.read_parquet(caminho)
+                curvas.index = curvas.index.astype("datetime64[ns]")
+                curvas.columns = pd.MultiIndex.from_tuples(
+                    [(f, float(p)) for f, p in (c.split("|") for c in curvas.columns)], names=["familia", "prazo"]
+                )
+                return curvas
+    except (FileNotFoundError, ValueError):
+        pass
+
+    historico = ler_armazem(["Tipo Titulo", "Data Vencimento", coluna_taxa], diretorio=diretorio)
+    curvas = construir_curvas(historico, coluna_taxa, prazos)
+    # Parquet só aceita nomes de coluna em texto: (familia, prazo) vira "familia|prazo"
+    planas = curvas.copy()
+    planas.columns = [f"{familia}|{prazo}" for familia, prazo in curvas.columns]
+    planas.to_parquet(caminho)
+    with open(caminho + ".json", "w", encoding="utf-8") as f:
+        json.dump(versao, f)
+    return curvas
+
+
+# Curva de uma família em uma data (ou na última data disponível até ela)
+def curva_do_dia(curvas, familia, data=None):
+    matriz = curvas[familia]
+    if data is None:
+        return matriz.iloc[-1]
+    posicao = matriz.index.searchsorted(pd.Timestamp(data), side="right") - 1
+    if posicao < 0:
+        return pd.Series(np.nan, index=matriz.columns, name=pd.Timestamp(data))
+    return matriz.iloc[posicao]
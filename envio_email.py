@@ -0,0 +1,233 @@
+import os
+import gzip
+import base64
+import hashlib
+import mmap
+import smtplib
+import tempfile
+import threading
+import zipfile
+from collections import namedtuple, OrderedDict
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.base import MIMEBase
+
+from metricas import registrar_cache
+
+# Destinatário de um lote; assunto e corpo None usam os valores padrão do lote
+Destinatario = namedtuple("Destinatario", ["email", "assunto", "corpo"], defaults=(None, None))
+ResultadoEnvio = namedtuple("ResultadoEnvio", ["email", "sucesso", "erro"])
+
+# Erros em que vale a pena reconectar e tentar de novo
+_ERROS_CONEXAO = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+# Blocos de leitura múltiplos de 57 bytes: cada 57 bytes viram uma linha de 76 caracteres em base64
+BLOCO_BASE64 = 57 * 1024
+# Limite do cache de anexos codificados, em bytes de payload
+LIMITE_CACHE_ANEXOS = 64 * 1024 * 1024
+# Limite de hashes memorizados (arquivos distintos, ou versões de um mesmo arquivo)
+LIMITE_CACHE_HASHES = 1024
+_TIPOS_COMPRESSAO = {None: ('application', 'octet-stream'), 'gzip': ('application', 'gzip'), 'zip': ('application', 'zip')}
+
+_cache_anexos = OrderedDict()
+_hashes = OrderedDict()
+_anexos_lock = threading.Lock()
+
+
+# SHA-256 do conteúdo, lido em blocos; memorizado enquanto tamanho e data de modificação não mudarem
+def hash_arquivo(caminho):
+    estado = os.stat(caminho)
+    chave = (os.path.abspath(caminho), estado.st_size, estado.st_mtime_ns)
+    with _anexos_lock:
+        if chave in _hashes:
+            _hashes.move_to_end(chave)
+            return _hashes[chave]
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            sha.update(bloco)
+    with _anexos_lock:
+        _hashes[chave] = sha.hexdigest()
+        # Descarta os hashes usados há mais tempo
+        while len(_hashes) > LIMITE_CACHE_HASHES:
+            _hashes.popitem(last=False)
+    return sha.hexdigest()
+
+
+# Codifica em base64 lendo o arquivo em blocos e gravando o resultado num temporário em disco.
+# O payload MIME precisa ser str: ele é criado direto do temporário mapeado em memória (mmap),
+# então a única cópia completa no heap é a str final.
+def _base64_em_blocos(arquivo):
+    with tempfile.TemporaryFile() as codificado:
+        for bloco in iter(lambda: arquivo.read(BLOCO_BASE64), b''):
+            codificado.write(base64.encodebytes(bloco))
+        codificado.flush()
+        # mmap não aceita arquivo vazio
+        if not codificado.tell():
+            return ''
+        with mmap.mmap(codificado.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            return str(mapa, 'ascii')
+
+
+# Comprime o arquivo em um temporário (em disco se for grande) e devolve-o posicionado no início
+def _comprimir(caminho, compressao):
+    temporario = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    if compressao == 'gzip':
+        with open(caminho, 'rb') as origem, gzip.GzipFile(filename=os.path.basename(caminho), mode='wb', fileobj=temporario) as destino:
+            for bloco in iter(lambda: origem.read(1024 * 1024), b''):
+                destino.write(bloco)
+    else:
+        with zipfile.ZipFile(temporario, 'w', compression=zipfile.ZIP_DEFLATED) as destino:
+            destino.write(caminho, arcname=os.path.basename(caminho))
+    temporario.seek(0)
+    return temporario
+
+
+def _nome_anexo(caminho, compressao):
+    nome = os.path.basename(caminho)
+    if compressao == 'gzip':
+        return nome + '.gz'
+    if compressao == 'zip':
+        return os.path.splitext(nome)[0] + '.zip'
+    return nome
+
+
+# Parte MIME do anexo, pronta para ser anexada a várias mensagens
+def montar_anexo(caminho, compressao=None):
+    """
+    compressao: None, 'gzip' ou 'zip' (útil para CSVs grandes)
+    A parte codificada fica em cache, indexada pelo hash do conteúdo; envios
+    seguintes do mesmo arquivo não releem nem recodificam nada. A parte
+    retornada é compartilhada e não deve ser alterada.
+    """
+    if compressao not in _TIPOS_COMPRESSAO:
+        raise ValueError(f"Compressão desconhecida: {compressao}")
+    nome = _nome_anexo(caminho, compressao)
+    chave = (hash_arquivo(caminho), compressao, nome)
+    with _anexos_lock:
+        if chave in _cache_anexos:
+            _cache_anexos.move_to_end(chave)
+            registrar_cache('anexos', True)
+            return _cache_anexos[chave]
+    registrar_cache('anexos', False)
+
+    if compressao:
+        with _comprimir(caminho, compressao) as arquivo:
+            payload = _base64_em_blocos(arquivo)
+    else:
+        with open(caminho, 'rb') as arquivo:
+            payload = _base64_em_blocos(arquivo)
+
+    part = MIMEBase(*_TIPOS_COMPRESSAO[compressao])
+    part.set_payload(payload)
+    part['Content-Transfer-Encoding'] = 'base64'
+    part.add_header('Content-Disposition', f'attachment; filename={nome}')
+
+    with _anexos_lock:
+        _cache_anexos[chave] = part
+        # Descarta os anexos usados há mais tempo quando o limite é ultrapassado
+        while len(_cache_anexos) > 1 and sum(len(p.get_payload()) for p in _cache_anexos.values()) > LIMITE_CACHE_ANEXOS:
+            _cache_anexos.popitem(last=False)
+    return part
+
+
+def montar_mensagem(remetente, destinatario, assunto, corpo, anexos=()):
+    msg = MIMEMultipart()
+    msg['From'] = remetente
+    msg['To'] = destinatario
+    msg['Subject'] = assunto
+    msg.attach(MIMEText(corpo, 'plain'))
+    for part in anexos:
+        msg.attach(part)
+    return msg
+
+
+# Sessão SMTP autenticada uma única vez e reaproveitada para um lote de mensagens
+class SessaoSMTP:
+    def __init__(self, servidor, porta, usuario=None, senha=None, usar_tls=True, timeout=30, tentativas=2):
+        """
+        usuario/senha: None para servidores sem autenticação (ex.: servidor de depuração local)
+        usar_tls: executa STARTTLS após conectar
+        tentativas: envios por mensagem quando a conexão cai no meio do lote
+        """
+        self.servidor = servidor
+        self.porta = porta
+        self.usuario = usuario
+        self.senha = senha
+        self.usar_tls = usar_tls
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self.conexao = None
+
+    def conectar(self):
+        self.fechar()
+        conexao = smtplib.SMTP(self.servidor, self.porta, timeout=self.timeout)
+        try:
+            if self.usar_tls:
+                conexao.starttls()
+            if self.usuario:
+                conexao.login(self.usuario, self.senha)
+        except Exception:
+            conexao.close()
+            raise
+        self.conexao = conexao
+        return conexao
+
+    def fechar(self):
+        if self.conexao is not None:
+            try:
+                self.conexao.quit()
+            except Exception:
+                self.conexao.close()
+            self.conexao = None
+
+    def __enter__(self):
+        self.conectar()
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    # Envia uma mensagem, reconectando se a conexão tiver caído
+    def enviar(self, msg):
+        for tentativa in range(1, self.tentativas + 1):
+            try:
+                if self.conexao is None:
+                    self.conectar()
+                self.conexao.send_message(msg)
+                return
+            except _ERROS_CONEXAO:
+                # Fecha o socket da conexão caída antes de descartá-la
+                if self.conexao is not None:
+                    try:
+                        self.conexao.close()
+                    except Exception:
+                        pass
+                self.conexao = None
+                if tentativa == self.tentativas:
+                    raise
+
+    # Envia um lote, uma mensagem por destinatário, e informa o resultado de cada um
+    def enviar_lote(self, remetente, destinatarios, assunto, corpo, anexos=()):
+        """
+        destinatarios: e-mails (str) ou Destinatario com assunto/corpo próprios
+        anexos: partes MIME (ver montar_anexo), montadas uma vez para todo o lote
+        Retorna uma lista de ResultadoEnvio na ordem dos destinatários.
+        """
+        resultados = []
+        for destinatario in destinatarios:
+            if isinstance(destinatario, str):
+                destinatario = Destinatario(destinatario)
+            try:
+                msg = montar_mensagem(
+                    remetente, destinatario.email,
+                    destinatario.assunto if destinatario.assunto is not None else assunto,
+                    destinatario.corpo if destinatario.corpo is not None else corpo,
+                    anexos,
+                )
+                self.enviar(msg)
+                resultados.append(ResultadoEnvio(destinatario.email, True, None))
+            except Exception as e:
+                resultados.append(ResultadoEnvio(destinatario.email, False, str(e)))
+        return resultados
@@ -0,0 +1,181 @@
+import os
+import json
+import glob
+import numpy as np
+import pandas as pd
+
+from historico_tesouro import ARMAZEM_DIR, ler_armazem, ultima_data_armazem
+from cache_compartilhado import trava_recurso
+
+# Estatísticas diárias por título, guardadas junto do armazenamento (o "_" esconde a
+# pasta do leitor do histórico)
+PASTA_ESTATISTICAS = "_estatisticas"
+ARQUIVO_CONTEXTO = "_contexto.parquet"
+ARQUIVO_RESUMO = "_resumo.parquet"
+MANIFESTO_ESTATISTICAS = "_manifesto.json"
+
+# Janela da volatilidade móvel, em pregões, e pregões por ano para anualizar
+JANELA_VOLATILIDADE = 21
+DIAS_UTEIS_ANO = 252
+
+CHAVE_TITULO = ["Tipo Titulo", "Data Vencimento"]
+COLUNAS_LEITURA = CHAVE_TITULO + [
+    "Taxa Compra Manha", "Taxa Venda Manha", "PU Compra Manha", "PU Venda Manha", "PU Base Manha",
+]
+COLUNAS_ESTATISTICAS = CHAVE_TITULO + [
+    "Data Base", "PU Base Manha", "Retorno", "Volatilidade", "Pico", "Drawdown", "Max Drawdown",
+    "Spread Taxa", "Spread PU",
+]
+
+
+# Estatísticas de todos os títulos de uma vez; com `anteriores`, continua as séries já calculadas
+def calcular_estatisticas(df, janela=JANELA_VOLATILIDADE, anteriores=None):
+    """
+    df: histórico com COLUNAS_LEITURA e "Data Base"
+    anteriores: últimas `janela` linhas de cada título já calculadas (saída desta função);
+                dão o contexto para retorno, volatilidade, pico e drawdown sem reler o passado
+    Retorna só as linhas de df, com COLUNAS_ESTATISTICAS, ordenadas por título e "Data Base".
+    Retorno e volatilidade (anualizada) vêm do "PU Base Manha"; os spreads são
+    venda - compra na taxa e compra - venda no PU, NaN quando o título não está à venda.
+    """
+    sem_compra = df["PU Compra Manha"].to_numpy() == 0
+    novas = pd.DataFrame({
+        "Tipo Titulo": df["Tipo Titulo"].astype(str).to_numpy(),
+        "Data Vencimento": df["Data Vencimento"].to_numpy(dtype="datetime64[ns]"),
+        "Data Base": df["Data Base"].to_numpy(dtype="datetime64[ns]"),
+        "PU Base Manha": df["PU Base Manha"].to_numpy(dtype="float64"),
+        "Spread Taxa": np.where(sem_compra, np.nan, df["Taxa Venda Manha"] - df["Taxa Compra Manha"]),
+        "Spread PU": np.where(sem_compra, np.nan, df["PU Compra Manha"] - df["PU Venda Manha"]),
+        "_novo": True,
+    })
+    if anteriores is not None and not anteriores.empty:
+        contexto = anteriores[CHAVE_TITULO + ["Data Base", "PU Base Manha", "Pico", "Max Drawdown"]]
+        novas = pd.concat([contexto.assign(_novo=False), novas], ignore_index=True)
+    dados = novas.sort_values(CHAVE_TITULO + ["Data Base"], kind="stable", ignore_index=True)
+
+    novo = dados["_novo"].to_numpy(dtype=bool)
+    pu = dados["PU Base Manha"]
+    codigo = dados.groupby(CHAVE_TITULO, sort=False).ngroup().to_numpy()
+    grupos = dados.groupby(codigo, sort=False)
+
+    retorno = grupos["PU Base Manha"].pct_change(fill_method=None)
+    # Janela móvel sobre a série inteira; janelas que cruzam dois títulos são descartadas
+    volatilidade = retorno.rolling(janela, min_periods=janela).std().to_numpy() * np.sqrt(DIAS_UTEIS_ANO)
+    inicio_janela = np.arange(len(dados)) - (janela - 1)
+    cruza = (inicio_janela < 0) | (codigo[np.maximum(inicio_janela, 0)] != codigo)
+    volatilidade[cruza] = np.nan
+
+    # As linhas de contexto entram com o pico e o drawdown máximo já acumulados
+    pico = pd.Series(np.where(novo, pu, dados.get("Pico", pu)), index=dados.index).groupby(codigo).cummax()
+    drawdown = pu / pico - 1
+    max_drawdown = pd.Series(
+        np.where(novo, drawdown, dados.get("Max Drawdown", drawdown)), index=dados.index
+    ).groupby(codigo).cummin()
+
+    dados = dados.assign(
+        Retorno=retorno, Volatilidade=volatilidade, Pico=pico, Drawdown=drawdown,
+        **{"Max Drawdown": max_drawdown},
+    )
+    return dados.loc[novo, COLUNAS_ESTATISTICAS].reset_index(drop=True)
+
+
+def _pasta(diretorio):
+    return os.path.join(diretorio, PASTA_ESTATISTICAS)
+
+
+def _ler_manifesto(pasta):
+    try:
+        with open(os.path.join(pasta, MANIFESTO_ESTATISTICAS), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _gravar_parquet(df, caminho):
+    temporario = os.path.join(os.path.dirname(caminho), "." + os.path.basename(caminho) + ".tmp")
+    df.to_parquet(temporario, index=False)
+    os.replace(temporario, caminho)
+
+
+# Resumo por título na última "Data Base": o que o app mostra. Títulos que não
+# aparecem nela (vencidos ou fora de negociação) ficam de fora
+def resumir_estatisticas(estatisticas):
+    ultimas = estatisticas.groupby(CHAVE_TITULO, sort=True).tail(1)
+    ultimas = ultimas[ultimas["Data Base"] == ultimas["Data Base"].max()]
+    titulo = ultimas["Tipo Titulo"] + " " + ultimas["Data Vencimento"].dt.year.astype(str)
+    return ultimas.drop(columns=["Pico", "Drawdown"]).assign(**{"Título": titulo}).reset_index(drop=True)
+
+
+# Acrescenta as estatísticas das "Data Base" novas do armazenamento
+def atualizar_estatisticas(diretorio=ARMAZEM_DIR, janela=JANELA_VOLATILIDADE):
+    """
+    Só lê do histórico as datas posteriores à última processada; o contexto de cada
+    título (últimas `janela` linhas) fica em _contexto.parquet. Mudando a janela,
+    tudo é recalculado. Retorna o número de linhas acrescentadas.
+    """
+    ultima_armazem = ultima_data_armazem(diretorio)
+    if ultima_armazem is None:
+        return 0
+    pasta = _pasta(diretorio)
+    with trava_recurso(pasta):
+        manifesto = _ler_manifesto(pasta)
+        anteriores, inicio = None, None
+        if manifesto is not None and manifesto.get("janela") == janela:
+            ultima = pd.Timestamp(manifesto["ultima_data"])
+            if ultima >= ultima_armazem:
+                return 0
+            anteriores = pd.read_parquet(os.path.join(pasta, ARQUIVO_CONTEXTO))
+            inicio = ultima + pd.Timedelta(days=1)
+        else:
+            manifesto = {"janela": janela, "linhas": 0}
+            for parte in glob.glob(os.path.join(pasta, "parte-*.parquet")):
+                os.remove(parte)
+
+        historico = ler_armazem(COLUNAS_LEITURA, inicio=inicio, diretorio=diretorio)
+        historico = historico.dropna(subset=CHAVE_TITULO + ["Data Base"])
+        if historico.empty:
+            return 0
+        novas = calcular_estatisticas(historico, janela, anteriores)
+
+        os.makedirs(pasta, exist_ok=True)
+        nome = f"parte-{novas['Data Base'].min():%Y%m%d}-{novas['Data Base'].max():%Y%m%d}.parquet"
+        _gravar_parquet(novas, os.path.join(pasta, nome))
+        contexto = pd.concat([anteriores, novas], ignore_index=True) if anteriores is not None else novas
+        contexto = contexto.sort_values(CHAVE_TITULO + ["Data Base"], kind="stable")
+        contexto = contexto.groupby(CHAVE_TITULO, sort=False).tail(janela).reset_index(drop=True)
+        _gravar_parquet(contexto, os.path.join(pasta, ARQUIVO_CONTEXTO))
+        _gravar_parquet(resumir_estatisticas(contexto), os.path.join(pasta, ARQUIVO_RESUMO))
+
+        manifesto["ultima_data"] = novas["Data Base"].max().strftime("%Y-%m-%d")
+        manifesto["linhas"] += len(novas)
+        temporario = os.path.join(pasta, "." + MANIFESTO_ESTATISTICAS + ".tmp")
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(manifesto, f)
+        os.replace(temporario, os.path.join(pasta, MANIFESTO_ESTATISTICAS))
+        return len(novas)
+
+
+# Série diária já calculada, lendo só as colunas e datas pedidas
+def ler_estatisticas(colunas=None, inicio=None, fim=None, diretorio=ARMAZEM_DIR):
+    filtros = []
+    if inicio is not None:
+        filtros.append(("Data Base", ">=", pd.Timestamp(inicio)))
+    if fim is not None:
+        filtros.append(("Data Base", "<=", pd.Timestamp(fim)))
+    pasta = _pasta(diretorio)
+    if not glob.glob(os.path.join(pasta, "parte-*.parquet")):
+        return pd.DataFrame(columns=colunas or COLUNAS_ESTATISTICAS)
+    return pd.read_parquet(pasta, columns=colunas, filters=filtros or None)
+
+
+# Resumo pré-calculado (uma linha por título); vazio se atualizar_estatisticas nunca rodou
+def ler_resumo_estatisticas(diretorio=ARMAZEM_DIR):
+    try:
+        return pd.read_parquet(os.path.join(_pasta(diretorio), ARQUIVO_RESUMO))
+    except FileNotFoundError:
+        return pd.DataFrame()
+
+
+if __name__ == "__main__":
+    novas = atualizar_estatisticas()
+    print(f"{novas} linhas de estatísticas acrescentadas em {_pasta(ARMAZEM_DIR)}")
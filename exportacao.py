@@ -0,0 +1,145 @@
+import os
+import io
+import json
+import hashlib
+from collections import namedtuple
+import pandas as pd
+
+# Escritor xlsx em memória constante, se estiver instalado; senão usa o openpyxl
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+ResultadoExportacao = namedtuple("ResultadoExportacao", ["caminho", "alterado", "diferencas"])
+
+FORMATOS = ("xlsx", "parquet", "csv")
+
+
+def _caminho_fonte(caminho):
+    return caminho + ".fonte.csv"
+
+
+def _caminho_meta(caminho):
+    return caminho + ".fonte.json"
+
+
+# Formato de saída pela extensão do arquivo (.xlsx, .parquet ou .csv)
+def formato_do_arquivo(caminho):
+    formato = os.path.splitext(caminho)[1].lstrip(".").lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de saída não suportado: {formato or caminho}")
+    return formato
+
+
+# xlsx em memória constante: cada linha é gravada em disco assim que escrita.
+# O modo constant_memory exige escrita linha a linha, por isso não passa pelo to_excel.
+def _gravar_xlsx_em_fluxo(df, caminho):
+    workbook = xlsxwriter.Workbook(caminho, {"constant_memory": True, "nan_inf_to_errors": True})
+    try:
+        planilha = workbook.add_worksheet()
+        planilha.write_row(0, 0, [str(c) for c in df.columns])
+        valores = df.astype(object).where(df.notna(), None)
+        for linha, registro in enumerate(valores.itertuples(index=False, name=None), start=1):
+            planilha.write_row(linha, 0, registro)
+    finally:
+        workbook.close()
+
+
+def _gravar(df, caminho, formato):
+    pasta, nome = os.path.split(caminho)
+    # Mantém a extensão no temporário: o pandas escolhe o escritor de Excel por ela
+    temporario = os.path.join(pasta, ".tmp-" + nome)
+    if formato == "xlsx":
+        if xlsxwriter is not None:
+            _gravar_xlsx_em_fluxo(df, temporario)
+        else:
+            df.to_excel(temporario, index=False, engine="openpyxl")
+    elif formato == "parquet":
+        df.to_parquet(temporario, index=False)
+    else:
+        df.to_csv(temporario, index=False)
+    os.replace(temporario, caminho)
+
+
+# Grava bytes num temporário e renomeia, para nunca deixar um arquivo pela metade
+def _gravar_bytes(dados, caminho):
+    pasta, nome = os.path.split(caminho)
+    temporario = os.path.join(pasta, ".tmp-" + nome)
+    with open(temporario, "wb") as f:
+        f.write(dados)
+    os.replace(temporario, caminho)
+
+
+# Diferenças linha a linha entre duas versões da planilha, pela coluna-chave
+def comparar_versoes(anterior, atual, chave=None):
+    """
+    chave: coluna que identifica a linha (padrão: a primeira coluna, ex.: o ticker)
+    Retorna um DataFrame com chave, 'Situação' (incluído/removido/alterado),
+    'Coluna', 'Antes' e 'Depois'.
+    """
+    chave = chave or atual.columns[0]
+    colunas_saida = [chave, "Situação", "Coluna", "Antes", "Depois"]
+    if anterior is None or chave not in anterior.columns:
+        return pd.DataFrame(columns=colunas_saida)
+
+    antes = anterior.drop_duplicates(chave, keep="last").set_index(chave)
+    depois = atual.drop_duplicates(chave, keep="last").set_index(chave)
+    partes = []
+
+    incluidos = depois.index.difference(antes.index)
+    removidos = antes.index.difference(depois.index)
+    partes.append(pd.DataFrame({chave: incluidos, "Situação": "incluído"}))
+    partes.append(pd.DataFrame({chave: removidos, "Situação": "removido"}))
+
+    comuns = antes.index.intersection(depois.index)
+    colunas = antes.columns.intersection(depois.columns)
+    a = antes.loc[comuns, colunas].astype(object)
+    d = depois.loc[comuns, colunas].astype(object)
+    mudou = (a != d) & ~(a.isna() & d.isna())
+    if mudou.to_numpy().any():
+        empilhado = mudou.stack()
+        posicoes = empilhado[empilhado].index
+        partes.append(pd.DataFrame({
+            chave: posicoes.get_level_values(0),
+            "Situação": "alterado",
+            "Coluna": posicoes.get_level_values(1),
+            "Antes": [a.at[i, c] for i, c in posicoes],
+            "Depois": [d.at[i, c] for i, c in posicoes],
+        }))
+    partes = [p for p in partes if not p.empty]
+    if not partes:
+        return pd.DataFrame(columns=colunas_saida)
+    return pd.concat(partes, ignore_index=True).reindex(columns=colunas_saida)
+
+
+# Grava a planilha a partir do CSV baixado, só quando o conteúdo mudou
+def exportar_csv(conteudo, caminho, chave=None, forcar=False):
+    """
+    conteudo: bytes do CSV exportado pelo Google Sheets
+    caminho: arquivo de saída; a extensão escolhe o formato (xlsx, parquet, csv)
+    Guarda ao lado da saída o último CSV recebido e o seu hash; se o hash não
+    mudou e a saída existe, nada é regravado.
+    Retorna um ResultadoExportacao com as diferenças em relação à versão
+    anterior (None quando nada mudou).
+    """
+    formato = formato_do_arquivo(caminho)
+    digest = hashlib.sha256(conteudo).hexdigest()
+    try:
+        with open(_caminho_meta(caminho), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        meta = {}
+    if not forcar and meta.get("sha256") == digest and os.path.exists(caminho):
+        return ResultadoExportacao(caminho, False, None)
+
+    atual = pd.read_csv(io.BytesIO(conteudo))
+    anterior = pd.read_csv(_caminho_fonte(caminho)) if os.path.exists(_caminho_fonte(caminho)) else None
+    diferencas = comparar_versoes(anterior, atual, chave)
+
+    # O hash vai por último: se algo falhar antes, a próxima chamada regrava tudo
+    _gravar(atual, caminho, formato)
+    _gravar_bytes(conteudo, _caminho_fonte(caminho))
+    meta = {"sha256": digest, "formato": formato, "linhas": len(atual)}
+    _gravar_bytes(json.dumps(meta).encode("utf-8"), _caminho_meta(caminho))
+    return ResultadoExportacao(caminho, True, diferencas)
@@ -0,0 +1,128 @@
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from transferencia import baixar_arquivo, ler_blocos
+from metricas import medir, registrar_cache, registrar_bytes
+from transporte import obter_sessao
+from cache_compartilhado import obter_compartilhado
+
+# Declaração de uma fonte de dados
+#   url: endereço de origem
+#   parser: recebe o conteúdo baixado (bytes) ou, se houver caminho, o caminho do arquivo
+#   ttl: segundos em que o último resultado é reaproveitado (0 = sempre busca)
+#   timeout: tempo limite da fonte, em segundos
+#   caminho: se informado, o download é gravado nele (condicional, retomável e compartilhado entre processos)
+#   verificar_ssl: False para hosts com certificado inválido (como o do Tesouro Direto)
+Fonte = namedtuple(
+    "Fonte", ["nome", "url", "parser", "ttl", "timeout", "caminho", "verificar_ssl"], defaults=(0, 30, None, True)
+)
+
+ResultadoFonte = namedtuple("ResultadoFonte", ["nome", "sucesso", "valor", "erro", "duracao", "do_cache"])
+
+_fontes = {}
+_cache = {}
+_locks = {}
+_registro_lock = threading.Lock()
+
+
+# Registra (ou substitui) uma fonte pelo nome
+def registrar_fonte(fonte):
+    with _registro_lock:
+        if _fontes.get(fonte.nome) != fonte:
+            _cache.pop(fonte.nome, None)
+        _fontes[fonte.nome] = fonte
+        _locks.setdefault(fonte.nome, threading.Lock())
+    return fonte
+
+
+def fontes_registradas():
+    return list(_fontes.values())
+
+
+# Corpo da resposta, desistindo quando o prazo passa (ver transferencia.ler_blocos)
+def _ler_ate(fonte, prazo, timeout):
+    with obter_sessao().get(fonte.url, timeout=timeout, verify=fonte.verificar_ssl, stream=True) as resposta:
+        resposta.raise_for_status()
+        return b"".join(ler_blocos(resposta, prazo=prazo))
+
+
+# Busca uma única fonte, respeitando a política de cache; erros viram ResultadoFonte
+def buscar_fonte(fonte, forcar=False, prazo=None):
+    """
+    prazo: instante (time.monotonic()) em que a busca desiste; None para fonte.timeout
+           a partir de agora. A espera pelas travas e o timeout de cada operação de
+           rede saem do que resta do prazo, e a transferência é lida em blocos que
+           conferem o prazo, então a busca (e a trava da fonte) termina quando ele acaba.
+    """
+    inicio = time.monotonic()
+    prazo = inicio + fonte.timeout if prazo is None else prazo
+
+    def restante():
+        return max(prazo - time.monotonic(), 0.001)
+
+    # Chamadas simultâneas para a mesma fonte esperam a primeira e usam o cache dela
+    lock = _locks.setdefault(fonte.nome, threading.Lock())
+    if not lock.acquire(timeout=restante()):
+        erro = f"Tempo limite de {fonte.timeout}s excedido"
+        return ResultadoFonte(fonte.nome, False, None, erro, time.monotonic() - inicio, False)
+    try:
+        em_cache = _cache.get(fonte.nome)
+        if not forcar and em_cache and fonte.ttl and time.monotonic() - em_cache[0] < fonte.ttl:
+            registrar_cache(f"fonte:{fonte.nome}", True)
+            return ResultadoFonte(fonte.nome, True, em_cache[1], None, time.monotonic() - inicio, True)
+        registrar_cache(f"fonte:{fonte.nome}", False)
+        try:
+            with medir(f"fonte:{fonte.nome}"):
+                if fonte.caminho:
+                    # Outras sessões ou processos baixando o mesmo arquivo: espera e reaproveita
+                    obter_compartilhado(fonte.caminho, lambda: baixar_arquivo(
+                        fonte.url, fonte.caminho, timeout=restante(), verificar_ssl=fonte.verificar_ssl, prazo=prazo
+                    ), idade_maxima=fonte.ttl, forcar=forcar, timeout=restante())
+                    valor = fonte.parser(fonte.caminho)
+                else:
+                    conteudo = _ler_ate(fonte, prazo, restante())
+                    registrar_bytes(fonte.nome, len(conteudo))
+                    valor = fonte.parser(conteudo)
+        except Exception as e:
+            return ResultadoFonte(fonte.nome, False, None, str(e), time.monotonic() - inicio, False)
+        _cache[fonte.nome] = (time.monotonic(), valor)
+        return ResultadoFonte(fonte.nome, True, valor, None, time.monotonic() - inicio, False)
+    finally:
+        lock.release()
+
+
+# Atualiza várias fontes em paralelo; o tempo total é o da fonte mais lenta
+def atualizar_fontes(nomes=None, forcar=False, max_workers=None):
+    """
+    nomes: fontes registradas a atualizar (None para todas)
+    Retorna {nome: ResultadoFonte}. Uma fonte que passa do seu timeout é
+    reportada como falha sem atrasar as demais.
+    """
+    fontes = [_fontes[nome] for nome in nomes] if nomes is not None else fontes_registradas()
+    if not fontes:
+        return {}
+
+    inicio = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(fontes), thread_name_prefix="fonte")
+    futuros = {executor.submit(buscar_fonte, fonte, forcar, inicio + fonte.timeout): fonte for fonte in fontes}
+    resultados = {}
+    pendentes = set(futuros)
+    try:
+        while pendentes:
+            prazo = min(inicio + futuros[futuro].timeout for futuro in pendentes)
+            feitos, pendentes = wait(pendentes, timeout=max(prazo - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            for futuro in feitos:
+                resultados[futuros[futuro].nome] = futuro.result()
+            agora = time.monotonic()
+            for futuro in [f for f in pendentes if agora >= inicio + futuros[f].timeout]:
+                fonte = futuros[futuro]
+                resultados[fonte.nome] = ResultadoFonte(
+                    fonte.nome, False, None, f"Tempo limite de {fonte.timeout}s excedido", agora - inicio, False
+                )
+                pendentes.discard(futuro)
+    finally:
+        # Não espera por fontes que estouraram o tempo limite: elas desistem sozinhas no prazo
+        executor.shutdown(wait=False, cancel_futures=True)
+    return {fonte.nome: resultados[fonte.nome] for fonte in fontes}
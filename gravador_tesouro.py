@@ -0,0 +1,346 @@
+"""
+Gravador intradiário dos preços do Tesouro Direto.
+
+Processo em segundo plano que consulta o treasurybondsinfo.json durante o
+horário de negociação (TrsrBondMkt: opngDtTm/clsgDtTm, sts) e grava em SQLite
+apenas o que mudou desde a captura anterior de cada título.
+
+A cada captura também roda o ciclo dos alertas de taxa (alertas_tesouro), com o
+servidor SMTP da seção [email] do secrets.toml; os apps só editam os alertas.
+
+Uso:
+    python gravador_tesouro.py [--banco dados/intradiario.sqlite] [--intervalo 60]
+                               [--secrets .streamlit/secrets.toml] [--sem-alertas]
+"""
+import os
+import time
+import sqlite3
+import argparse
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+
+from api_tesouro import obter_snapshot
+from alertas_tesouro import ciclo_alertas, enviador_smtp
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11: o pacote toml vem com o streamlit
+    tomllib = None
+
+BANCO_PADRAO = os.path.normpath(os.path.join("dados", "intradiario.sqlite"))
+SECRETS_PADRAO = os.path.normpath(os.path.join(".streamlit", "secrets.toml"))
+# Intervalos de consulta (em segundos) com o mercado aberto e fechado
+INTERVALO_ABERTO = 60
+INTERVALO_FECHADO = 600
+# Horário de Brasília (sem horário de verão desde 2019)
+FUSO_MERCADO = timezone(timedelta(hours=-3))
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS capturas (
+    id INTEGER PRIMARY KEY,
+    capturado_em REAL NOT NULL,
+    valido_ate REAL NOT NULL,
+    status TEXT,
+    abertura TEXT,
+    fechamento TEXT
+);
+CREATE TABLE IF NOT EXISTS titulos (
+    id INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL UNIQUE,
+    tipo TEXT,
+    vencimento TEXT
+);
+CREATE TABLE IF NOT EXISTS precos (
+    captura_id INTEGER NOT NULL,
+    titulo_id INTEGER NOT NULL,
+    tx_compra REAL,
+    pu_compra REAL,
+    tx_venda REAL,
+    pu_venda REAL,
+    removido INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (titulo_id, captura_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS precos_captura ON precos (captura_id);
+"""
+
+# Campos do TrsrBd gravados a cada mudança, na ordem das colunas de precos
+_CAMPOS_PRECO = ("anulInvstmtRate", "untrInvstmtVal", "anulRedRate", "untrRedVal")
+# Em _ultimos_precos, título que saiu da lista da API (linha "removido" em precos)
+REMOVIDO = None
+
+
+def abrir_banco(caminho=BANCO_PADRAO):
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    conn = sqlite3.connect(caminho, timeout=30)
+    # WAL permite que os apps leiam enquanto o gravador escreve
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_ESQUEMA)
+    # Bancos criados antes da coluna "removido"
+    colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(precos)")}
+    if "removido" not in colunas:
+        conn.execute("ALTER TABLE precos ADD COLUMN removido INTEGER NOT NULL DEFAULT 0")
+    return conn
+
+
+# Último valor gravado de cada título: {titulo_id: (tx_compra, pu_compra, tx_venda, pu_venda)},
+# ou REMOVIDO se o título saiu da lista da API
+def _ultimos_precos(conn, ate_captura=None):
+    # Uma busca pela chave primária (titulo_id, captura_id) por título, sem varrer precos
+    linhas = conn.execute("""
+        SELECT p.titulo_id, p.tx_compra, p.pu_compra, p.tx_venda, p.pu_venda, p.removido
+        FROM titulos t
+        JOIN precos p ON p.titulo_id = t.id AND p.captura_id = (
+            SELECT MAX(q.captura_id) FROM precos q WHERE q.titulo_id = t.id AND q.captura_id <= ?)
+    """, (ate_captura if ate_captura is not None else 2 ** 62,)).fetchall()
+    return {linha[0]: REMOVIDO if linha[5] else tuple(linha[1:5]) for linha in linhas}
+
+
+def _id_titulo(conn, bd, cache):
+    nome = bd["nm"]
+    if nome not in cache:
+        conn.execute(
+            "INSERT OR IGNORE INTO titulos (nome, tipo, vencimento) VALUES (?, ?, ?)",
+            (nome, bd["FinIndxs"]["nm"], bd["mtrtyDt"]),
+        )
+        cache[nome] = conn.execute("SELECT id FROM titulos WHERE nome = ?", (nome,)).fetchone()[0]
+    return cache[nome]
+
+
+# Grava uma captura; só os títulos cujos valores mudaram ganham linha em precos, e os
+# que sumiram da lista ganham uma linha "removido"
+def gravar_snapshot(conn, snapshot, valido_por=INTERVALO_ABERTO, capturado_em=None, ultimos=None):
+    """
+    valido_por: segundos até a próxima captura prevista; os leitores tratam a
+                captura como atual até lá
+    ultimos: dict de _ultimos_precos() mantido pelo chamador entre capturas; só é
+             atualizado depois que a transação é confirmada, então uma gravação que
+             falha (ex.: "database is locked") é refeita por inteiro na próxima captura
+    Retorna o número de títulos alterados.
+    """
+    capturado_em = capturado_em if capturado_em is not None else time.time()
+    mkt = snapshot["response"]["TrsrBondMkt"]
+    if ultimos is None:
+        ultimos = _ultimos_precos(conn)
+    ids = {}
+    with conn:
+        captura_id = conn.execute(
+            "INSERT INTO capturas (capturado_em, valido_ate, status, abertura, fechamento) VALUES (?, ?, ?, ?, ?)",
+            (capturado_em, capturado_em + valido_por, mkt.get("sts"), mkt.get("opngDtTm"), mkt.get("clsgDtTm")),
+        ).lastrowid
+        alterados = []
+        mudancas = {}
+        for item in snapshot["response"]["TrsrBdTradgList"]:
+            bd = item["TrsrBd"]
+            titulo_id = _id_titulo(conn, bd, ids)
+            valores = tuple(bd.get(campo) for campo in _CAMPOS_PRECO)
+            mudancas[titulo_id] = valores
+            if ultimos.get(titulo_id) != valores:
+                alterados.append((captura_id, titulo_id) + valores + (0,))
+        for titulo_id, valores in ultimos.items():
+            if valores is not REMOVIDO and titulo_id not in mudancas:
+                alterados.append((captura_id, titulo_id, None, None, None, None, 1))
+                mudancas[titulo_id] = REMOVIDO
+        conn.executemany(
+            "INSERT INTO precos (captura_id, titulo_id, tx_compra, pu_compra, tx_venda, pu_venda, removido)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)", alterados)
+    # Só depois do commit: com rollback, ultimos continua igual ao que está no banco
+    ultimos.update(mudancas)
+    return len(alterados)
+
+
+# Id da última captura ainda válida (None se não houver): consulta barata, para
+# versionar caches da captura nos apps
+def ultima_captura(caminho=BANCO_PADRAO, somente_valido=True):
+    if not os.path.exists(caminho):
+        return None
+    conn = sqlite3.connect(caminho, timeout=30)
+    try:
+        captura = conn.execute("SELECT id, valido_ate FROM capturas ORDER BY id DESC LIMIT 1").fetchone()
+    finally:
+        conn.close()
+    if captura is None or (somente_valido and captura[1] < time.time()):
+        return None
+    return captura[0]
+
+
+# Reconstrói, no formato do treasurybondsinfo.json, a última captura gravada
+def ler_ultimo_snapshot(caminho=BANCO_PADRAO, somente_valido=True, captura_id=None):
+    """
+    somente_valido: retorna None se a última captura já passou do prazo
+                    anunciado pelo gravador (ex.: gravador parado)
+    captura_id: reconstrói essa captura em vez da última (ex.: a de ultima_captura())
+    O resultado pode ser passado como snapshot para status_mercado_df/consultaTD.
+    Títulos que saíram da lista da API não aparecem.
+    """
+    if not os.path.exists(caminho):
+        return None
+    conn = sqlite3.connect(caminho, timeout=30)
+    try:
+        if captura_id is None:
+            captura = conn.execute(
+                "SELECT id, valido_ate, status, abertura, fechamento FROM capturas ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        else:
+            captura = conn.execute(
+                "SELECT id, valido_ate, status, abertura, fechamento FROM capturas WHERE id = ?", (captura_id,)
+            ).fetchone()
+        if captura is None or (somente_valido and captura[1] < time.time()):
+            return None
+        captura_id, _, status, abertura, fechamento = captura
+        ultimos = _ultimos_precos(conn, captura_id)
+        titulos = conn.execute("SELECT id, nome, tipo, vencimento FROM titulos").fetchall()
+    finally:
+        conn.close()
+
+    lista = []
+    for titulo_id, nome, tipo, vencimento in titulos:
+        if ultimos.get(titulo_id, REMOVIDO) is REMOVIDO:
+            continue
+        bd = dict(zip(_CAMPOS_PRECO, ultimos[titulo_id]))
+        bd.update(nm=nome, mtrtyDt=vencimento, FinIndxs={"nm": tipo})
+        lista.append({"TrsrBd": bd})
+    return {"response": {
+        "TrsrBondMkt": {"opngDtTm": abertura, "clsgDtTm": fechamento, "sts": status},
+        "TrsrBdTradgList": lista,
+    }}
+
+
+# Série intradiária de um dia (horário de Brasília), com os valores repetidos entre mudanças
+def serie_intradiaria(caminho=BANCO_PADRAO, dia=None):
+    """
+    dia: date ou string 'AAAA-MM-DD' (None para hoje)
+    Retorna um DataFrame com uma linha por (captura, título).
+    """
+    colunas = ["Capturado em", "Tipo", "Título", "Rentabilidade (Compra)", "Preço R$ (Compra)",
+               "Rentabilidade (Venda)", "Preço R$ (Venda)"]
+    if not os.path.exists(caminho):
+        return pd.DataFrame(columns=colunas)
+    dia = pd.Timestamp(dia or datetime.now(FUSO_MERCADO).date())
+    inicio = dia.tz_localize(FUSO_MERCADO).timestamp()
+    fim = inicio + 24 * 60 * 60
+
+    conn = sqlite3.connect(caminho, timeout=30)
+    try:
+        capturas = pd.read_sql_query(
+            "SELECT id, capturado_em FROM capturas WHERE capturado_em >= ? AND capturado_em < ? ORDER BY id",
+            conn, params=(inicio, fim),
+        )
+        if capturas.empty:
+            return pd.DataFrame(columns=colunas)
+        # Deltas do dia (índice precos_captura) e, por título, o último valor anterior
+        # ao dia (chave primária), para preencher o início da série
+        primeira, ultima = int(capturas["id"].iloc[0]), int(capturas["id"].iloc[-1])
+        precos = pd.read_sql_query("""
+            SELECT p.captura_id, t.tipo, t.nome, p.tx_compra, p.pu_compra, p.tx_venda, p.pu_venda, p.removido
+            FROM precos p JOIN titulos t ON t.id = p.titulo_id
+            WHERE p.captura_id BETWEEN ? AND ?
+            UNION ALL
+            SELECT p.captura_id, t.tipo, t.nome, p.tx_compra, p.pu_compra, p.tx_venda, p.pu_venda, p.removido
+            FROM titulos t
+            JOIN precos p ON p.titulo_id = t.id AND p.captura_id = (
+                SELECT MAX(q.captura_id) FROM precos q WHERE q.titulo_id = t.id AND q.captura_id < ?)
+        """, conn, params=(primeira, ultima, primeira))
+    finally:
+        conn.close()
+
+    precos.columns = ["captura_id"] + colunas[1:] + ["removido"]
+    precos = precos.sort_values("captura_id", kind="stable")
+    precos["captura_id"] = precos["captura_id"].clip(lower=primeira)
+    precos = precos.drop_duplicates(["captura_id", "Título"], keep="last").reset_index(drop=True)
+    # Grade completa (captura x título): cada célula recebe a última linha gravada até
+    # ela (linha inteira, para que um "removido" encerre a série do título)
+    grade = pd.MultiIndex.from_product([capturas["id"], precos["Título"].unique()], names=["captura_id", "Título"])
+    posicao = (
+        pd.Series(precos.index, index=pd.MultiIndex.from_frame(precos[["captura_id", "Título"]]))
+        .reindex(grade)
+        .groupby(level="Título").ffill()
+        .dropna()
+    )
+    serie = precos.loc[posicao.astype("int64").to_numpy()].assign(captura_id=posicao.index.get_level_values("captura_id"))
+    serie = serie[serie["removido"] == 0].reset_index(drop=True)
+    serie["Capturado em"] = pd.to_datetime(
+        serie["captura_id"].map(capturas.set_index("id")["capturado_em"]), unit="s", utc=True
+    ).dt.tz_convert(FUSO_MERCADO)
+    return serie[colunas]
+
+
+# Indica se o horário atual está dentro da janela de negociação informada pela API
+def mercado_aberto(snapshot, agora=None):
+    mkt = snapshot["response"]["TrsrBondMkt"]
+    if str(mkt.get("sts", "")).lower() != "aberto":
+        return False
+    agora = agora or datetime.now(FUSO_MERCADO)
+    try:
+        abertura = datetime.fromisoformat(mkt["opngDtTm"][:19]).replace(tzinfo=FUSO_MERCADO)
+        fechamento = datetime.fromisoformat(mkt["clsgDtTm"][:19]).replace(tzinfo=FUSO_MERCADO)
+    except (KeyError, TypeError, ValueError):
+        return True
+    return abertura <= agora < fechamento
+
+
+# Seção [email] do secrets.toml usado pelo app_prod (None se não houver)
+def ler_config_email(caminho=SECRETS_PADRAO):
+    try:
+        if tomllib is not None:
+            with open(caminho, "rb") as f:
+                secrets = tomllib.load(f)
+        else:
+            import toml
+            secrets = toml.load(caminho)
+    except FileNotFoundError:
+        return None
+    return secrets.get("email")
+
+
+# Laço principal: captura com frequência maior na janela de negociação
+def executar(caminho=BANCO_PADRAO, intervalo=INTERVALO_ABERTO, intervalo_fechado=INTERVALO_FECHADO,
+             enviar_alertas=None):
+    """
+    enviar_alertas: função de envio dos alertas de taxa (ex.: alertas_tesouro.enviador_smtp);
+                    None desliga os alertas
+    """
+    conn = abrir_banco(caminho)
+    ultimos = _ultimos_precos(conn)
+    while True:
+        snapshot = None
+        try:
+            snapshot = obter_snapshot(forcar=True)
+            espera = intervalo if mercado_aberto(snapshot) else intervalo_fechado
+            # Margem de uma captura perdida antes de os apps voltarem a consultar a API
+            alterados = gravar_snapshot(conn, snapshot, valido_por=2 * espera, ultimos=ultimos)
+            print(f"{datetime.now(FUSO_MERCADO):%d/%m/%Y %H:%M:%S} - {alterados} título(s) alterado(s)", flush=True)
+        except Exception as e:
+            espera = intervalo
+            print(f"{datetime.now(FUSO_MERCADO):%d/%m/%Y %H:%M:%S} - Falha na captura: {e}", flush=True)
+        if snapshot is not None and enviar_alertas is not None:
+            try:
+                resultados = ciclo_alertas(snapshot, enviar_alertas)
+                if resultados:
+                    enviados = sum(r.sucesso for r in resultados)
+                    print(f"{datetime.now(FUSO_MERCADO):%d/%m/%Y %H:%M:%S} - {enviados}/{len(resultados)} e-mail(s) de alerta enviado(s)", flush=True)
+            except Exception as e:
+                print(f"{datetime.now(FUSO_MERCADO):%d/%m/%Y %H:%M:%S} - Falha nos alertas: {e}", flush=True)
+        time.sleep(espera)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--banco", default=BANCO_PADRAO)
+    parser.add_argument("--intervalo", type=int, default=INTERVALO_ABERTO, help="segundos entre capturas com o mercado aberto")
+    parser.add_argument("--intervalo-fechado", type=int, default=INTERVALO_FECHADO, help="segundos entre capturas com o mercado fechado")
+    parser.add_argument("--secrets", default=SECRETS_PADRAO, help="secrets.toml com a seção [email] do servidor SMTP")
+    parser.add_argument("--sem-alertas", action="store_true", help="não envia os alertas de taxa")
+    args = parser.parse_args()
+    enviar_alertas = None
+    if not args.sem_alertas:
+        config_email = ler_config_email(args.secrets)
+        if config_email:
+            enviar_alertas = enviador_smtp(config_email)
+        else:
+            print(f"Sem seção [email] em {args.secrets}: alertas de taxa desligados.", flush=True)
+    try:
+        executar(args.banco, args.intervalo, args.intervalo_fechado, enviar_alertas)
+    except KeyboardInterrupt:
+        print("Encerrado pelo usuário.")
@@ -0,0 +1,380 @@
+import io
+import os
+import glob
+import json
+import time
+import argparse
+from urllib.parse import urlsplit
+import numpy as np
+import pandas as pd
+
+from metricas import registrar_bytes
+from transferencia import TIMEOUT_PADRAO
+from transporte import obter_sessao
+
+# URL do arquivo histórico do Tesouro Direto
+TESOURO_URL = "https://www.tesourotransparente.gov.br/ckan/dataset/df56aa42-484a-4a59-8184-7676580c81e3/resource/796d2059-14e9-44e3-80c9-2d9e30b405c1/download/PrecoTaxaTesouroDireto.csv"
+
+# Pasta do armazenamento local em Parquet, particionado por ano da "Data Base"
+ARMAZEM_DIR = os.path.normpath(os.path.join("dados", "tesouro"))
+# Arquivos iniciados por "_" ou "." são ignorados pelo leitor de Parquet
+MANIFESTO_ARMAZEM = "_manifesto.json"
+
+
+# Esquema do PrecoTaxaTesouroDireto.csv
+COLUNAS_DATA = ["Data Vencimento", "Data Base"]
+FORMATO_DATA = "%d/%m/%Y"
+DTYPES_CSV = {
+    "Tipo Titulo": "category",
+    "Taxa Compra Manha": "float64",
+    "Taxa Venda Manha": "float64",
+    "PU Compra Manha": "float64",
+    "PU Venda Manha": "float64",
+    "PU Base Manha": "float64",
+}
+COLUNAS_CSV = ["Tipo Titulo"] + COLUNAS_DATA + list(DTYPES_CSV)[1:]
+
+# Modo compacto: datas como nº de dias desde 1970-01-01 (int32) e valores em float32
+DIA_NULO = np.iinfo(np.int32).min
+# Erro absoluto aceito ao passar para float32: meio centavo (o CSV tem 2 casas decimais)
+TOLERANCIA_COMPACTA = 0.005
+
+
+# Lê o CSV do Tesouro (URL ou caminho local) já tipado
+def ler_csv_tesouro(fonte, colunas=None, engine=None):
+    """
+    colunas: subconjunto de COLUNAS_CSV (None para todas)
+    engine: 'c' ou 'pyarrow' (None usa o padrão do pandas)
+    Datas e decimais com vírgula são convertidos pelo próprio leitor; linhas
+    sem "Data Base" válida são descartadas.
+    """
+    colunas = list(colunas or COLUNAS_CSV)
+    if "Data Base" not in colunas:
+        colunas.append("Data Base")
+    datas = [c for c in COLUNAS_DATA if c in colunas]
+    if isinstance(fonte, str) and fonte.startswith(("http://", "https://")):
+        # Baixado pela sessão HTTP do projeto (ver transporte.py), não pelo pandas
+        resposta = obter_sessao().get(fonte, timeout=TIMEOUT_PADRAO)
+        resposta.raise_for_status()
+        registrar_bytes(os.path.basename(urlsplit(fonte).path), len(resposta.content))
+        fonte = io.BytesIO(resposta.content)
+    df = pd.read_csv(
+        fonte, sep=";", decimal=",", encoding="latin1",
+        usecols=colunas,
+        dtype={c: t for c, t in DTYPES_CSV.items() if c in colunas},
+        parse_dates=datas, date_format=FORMATO_DATA,
+        engine=engine,
+    )
+    # Se alguma data estiver fora do formato, o leitor devolve texto; converte com coerce
+    for coluna in datas:
+        df[coluna] = pd.to_datetime(df[coluna], format=FORMATO_DATA, errors="coerce").astype("datetime64[ns]")
+    return df.dropna(subset=["Data Base"])
+
+
+# Deixa o histórico pronto para análise: sem linhas incompletas, com ano de vencimento e ordenado
+def preparar_historico(df):
+    obrigatorias = [c for c in ["Data Base", "Data Vencimento", "PU Base Manha"] if c in df.columns]
+    df = df.dropna(subset=obrigatorias)
+    if "Data Vencimento" in df.columns:
+        df = df.assign(**{"Ano Vencimento": df["Data Vencimento"].dt.year})
+    return df.sort_values("Data Base", kind="stable").reset_index(drop=True)
+
+
+# Leitura completa do CSV já preparada para análise
+def carregar_historico(fonte=TESOURO_URL, colunas=None, engine=None, compacto=False):
+    """
+    compacto: True para o layout de compactar_historico()
+    """
+    df = preparar_historico(ler_csv_tesouro(fonte, colunas, engine))
+    return compactar_historico(df) if compacto else df
+
+
+# Datas -> nº de dias desde 1970-01-01 (int32), com DIA_NULO no lugar de NaT
+def datas_para_dias(datas):
+    datas = pd.to_datetime(pd.Series(datas) if np.ndim(datas) else pd.Series([datas]))
+    dias = datas.to_numpy(dtype="datetime64[D]").astype("int64")
+    return np.where(datas.isna().to_numpy(), DIA_NULO, dias).astype(np.int32)
+
+
+def dias_para_datas(dias):
+    dias = np.asarray(dias, dtype=np.int64)
+    datas = dias.astype("datetime64[D]").astype("datetime64[ns]")
+    return np.where(dias == DIA_NULO, np.datetime64("NaT"), datas)
+
+
+# Layout compacto do histórico, opcional: cabe mais cópias em cache por processo
+def compactar_historico(df, tolerancia=TOLERANCIA_COMPACTA):
+    """
+    - colunas de data viram int32 com o nº de dias desde 1970-01-01 (ver dias_para_datas)
+    - colunas float64 viram float32 se o erro máximo ficar dentro de `tolerancia`
+    - texto vira categoria e inteiros usam o menor tipo que comporta os valores
+    Os nomes das colunas não mudam; expandir_historico() desfaz a conversão.
+    """
+    compacto = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            compacto[coluna] = datas_para_dias(serie)
+        elif pd.api.types.is_float_dtype(serie) and serie.dtype != np.float32:
+            reduzida = serie.to_numpy(dtype=np.float32)
+            original = serie.to_numpy(dtype=np.float64)
+            if np.allclose(reduzida.astype(np.float64), original, rtol=0, atol=tolerancia, equal_nan=True):
+                compacto[coluna] = reduzida
+            else:
+                compacto[coluna] = serie.to_numpy()
+        elif pd.api.types.is_integer_dtype(serie) and not isinstance(serie.dtype, pd.CategoricalDtype):
+            compacto[coluna] = pd.to_numeric(serie, downcast="integer").to_numpy()
+        elif pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie):
+            compacto[coluna] = serie.astype("category")
+        else:
+            compacto[coluna] = serie
+    return pd.DataFrame(compacto, index=df.index)
+
+
+# Volta do layout compacto para o padrão (datas datetime64 e valores float64)
+def expandir_historico(df):
+    expandido = df.copy()
+    for coluna in COLUNAS_DATA:
+        if coluna in expandido.columns and pd.api.types.is_integer_dtype(expandido[coluna]):
+            expandido[coluna] = dias_para_datas(expandido[coluna].to_numpy())
+    for coluna in expandido.columns:
+        if expandido[coluna].dtype == np.float32:
+            expandido[coluna] = expandido[coluna].astype(np.float64)
+    return expandido
+
+
+# Memória por coluna nos dois layouts, para dimensionar caches e processos
+def relatorio_memoria(df, compacto=None):
+    """
+    df: histórico no layout padrão
+    compacto: o mesmo histórico já compactado (None para compactar aqui)
+    Retorna um DataFrame por coluna, com uma linha "Total" no final.
+    """
+    if compacto is None:
+        compacto = compactar_historico(df)
+    padrao = df.memory_usage(deep=True, index=False)
+    reduzido = compacto.memory_usage(deep=True, index=False)
+    relatorio = pd.DataFrame({
+        "Coluna": list(df.columns),
+        "Tipo (padrão)": [str(df[c].dtype) for c in df.columns],
+        "Bytes (padrão)": [int(padrao[c]) for c in df.columns],
+        "Tipo (compacto)": [str(compacto[c].dtype) for c in df.columns],
+        "Bytes (compacto)": [int(reduzido[c]) for c in df.columns],
+    })
+    total = pd.DataFrame([{
+        "Coluna": "Total", "Tipo (padrão)": "", "Bytes (padrão)": int(padrao.sum()),
+        "Tipo (compacto)": "", "Bytes (compacto)": int(reduzido.sum()),
+    }])
+    relatorio = pd.concat([relatorio, total], ignore_index=True)
+    relatorio["Redução (%)"] = (100 * (1 - relatorio["Bytes (compacto)"] / relatorio["Bytes (padrão)"])).round(1)
+    return relatorio
+
+
+def _caminho_resumo(caminho):
+    return caminho + ".resumo.json"
+
+
+# Resumo barato do CSV: última "Data Base", número de linhas e títulos
+def sondar_csv_tesouro(caminho, linhas_por_bloco=250_000):
+    """
+    Lê só "Data Base" e "Tipo Titulo", em blocos, e guarda o resultado em
+    <caminho>.resumo.json. Enquanto o tamanho e a data de modificação do
+    arquivo não mudarem, o resumo é lido direto do arquivo auxiliar.
+    Retorna {'ultima_data': Timestamp ou None, 'linhas': int, 'titulos': [str]}.
+    """
+    estado = os.stat(caminho)
+    chave = {"tamanho": estado.st_size, "mtime_ns": estado.st_mtime_ns}
+    try:
+        with open(_caminho_resumo(caminho), "r", encoding="utf-8") as f:
+            resumo = json.load(f)
+        if resumo.get("arquivo") == chave:
+            return _resumo_para_retorno(resumo)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    ultima = None
+    linhas = 0
+    titulos = set()
+    blocos = pd.read_csv(
+        caminho, sep=";", encoding="latin1", dtype=str,
+        usecols=lambda coluna: coluna in ("Data Base", "Tipo Titulo"),
+        chunksize=linhas_por_bloco,
+    )
+    for bloco in blocos:
+        linhas += len(bloco)
+        if "Tipo Titulo" in bloco.columns:
+            titulos.update(bloco["Tipo Titulo"].dropna().unique())
+        if "Data Base" in bloco.columns:
+            # Há poucas datas distintas por bloco: converte só os valores únicos
+            datas = pd.to_datetime(pd.Series(bloco["Data Base"].unique()), format=FORMATO_DATA, errors="coerce")
+            maior = datas.max()
+            if pd.notna(maior) and (ultima is None or maior > ultima):
+                ultima = maior
+
+    resumo = {
+        "arquivo": chave,
+        "ultima_data": ultima.strftime("%Y-%m-%d") if ultima is not None else None,
+        "linhas": linhas,
+        "titulos": sorted(titulos),
+    }
+    temporario = _caminho_resumo(caminho) + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(resumo, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, _caminho_resumo(caminho))
+    return _resumo_para_retorno(resumo)
+
+
+def _resumo_para_retorno(resumo):
+    ultima = resumo.get("ultima_data")
+    return {
+        "ultima_data": pd.Timestamp(ultima) if ultima else None,
+        "linhas": resumo.get("linhas", 0),
+        "titulos": resumo.get("titulos", []),
+    }
+
+
+def _caminho_manifesto(diretorio):
+    return os.path.join(diretorio, MANIFESTO_ARMAZEM)
+
+
+def ler_manifesto_armazem(diretorio=ARMAZEM_DIR):
+    try:
+        with open(_caminho_manifesto(diretorio), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _gravar_manifesto(diretorio, manifesto):
+    caminho = _caminho_manifesto(diretorio)
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+# Partes novas são gravadas com este sufixo (e um "." no início, que o leitor ignora)
+# e só ganham o nome final depois que o manifesto que as registra é salvo
+SUFIXO_PENDENTE = ".pendente"
+
+
+def _caminho_pendente(caminho):
+    pasta, nome = os.path.split(caminho)
+    return os.path.join(pasta, "." + nome + SUFIXO_PENDENTE)
+
+
+# Conclui as partes registradas no manifesto e descarta as que nunca foram registradas
+def _concluir_pendentes(diretorio, manifesto):
+    registradas = set()
+    for relativo in manifesto.get("pendentes", []):
+        final = os.path.join(diretorio, relativo)
+        registradas.add(os.path.abspath(_caminho_pendente(final)))
+        if os.path.exists(_caminho_pendente(final)):
+            os.replace(_caminho_pendente(final), final)
+    # As pendentes começam com "." e o glob não casa arquivos ocultos com "*"
+    for orfa in glob.glob(os.path.join(diretorio, "ano=*", ".*" + SUFIXO_PENDENTE)):
+        if os.path.abspath(orfa) not in registradas:
+            os.remove(orfa)
+    if "pendentes" in manifesto:
+        del manifesto["pendentes"]
+        _gravar_manifesto(diretorio, manifesto)
+
+
+# Última "Data Base" gravada no armazenamento (None se estiver vazio)
+def ultima_data_armazem(diretorio=ARMAZEM_DIR):
+    manifesto = ler_manifesto_armazem(diretorio)
+    if not manifesto or not manifesto.get("ultima_data"):
+        return None
+    return pd.Timestamp(manifesto["ultima_data"])
+
+
+# Acrescenta ao armazenamento apenas as datas posteriores à última gravada
+def atualizar_armazem(fonte=TESOURO_URL, diretorio=ARMAZEM_DIR, idade_maxima=None, engine=None):
+    """
+    fonte: URL ou caminho do PrecoTaxaTesouroDireto.csv
+    idade_maxima: segundos; se a última atualização for mais recente que isso,
+                  a fonte nem é lida
+    engine: leitor do CSV, ver ler_csv_tesouro()
+    Retorna o número de linhas acrescentadas.
+    As partes só entram no armazenamento depois do manifesto: se o processo
+    cair no meio, a próxima atualização conclui ou descarta o que ficou pendente,
+    sem duplicar linhas.
+    """
+    manifesto = ler_manifesto_armazem(diretorio) or {}
+    if os.path.isdir(diretorio):
+        _concluir_pendentes(diretorio, manifesto)
+    if idade_maxima is not None and time.time() - manifesto.get("atualizado_em", 0) < idade_maxima:
+        return 0
+
+    df = ler_csv_tesouro(fonte, engine=engine)
+    ultima = ultima_data_armazem(diretorio)
+    if ultima is not None:
+        df = df[df["Data Base"] > ultima]
+
+    os.makedirs(diretorio, exist_ok=True)
+    pendentes = []
+    for ano, parte in df.groupby(df["Data Base"].dt.year):
+        pasta = os.path.join(diretorio, f"ano={ano}")
+        os.makedirs(pasta, exist_ok=True)
+        parte = parte.sort_values("Data Base")
+        nome = f"parte-{parte['Data Base'].min():%Y%m%d}-{parte['Data Base'].max():%Y%m%d}.parquet"
+        parte.to_parquet(_caminho_pendente(os.path.join(pasta, nome)), index=False)
+        pendentes.append(os.path.join(f"ano={ano}", nome))
+
+    if not df.empty:
+        manifesto["ultima_data"] = df["Data Base"].max().strftime("%Y-%m-%d")
+        manifesto["linhas"] = manifesto.get("linhas", 0) + len(df)
+        manifesto["pendentes"] = pendentes
+    manifesto["atualizado_em"] = time.time()
+    # O manifesto salvo é o ponto de confirmação; depois as partes ganham o nome final
+    _gravar_manifesto(diretorio, manifesto)
+    _concluir_pendentes(diretorio, manifesto)
+    return len(df)
+
+
+# Lê o armazenamento lendo apenas as colunas e os anos necessários
+def ler_armazem(colunas=None, inicio=None, fim=None, diretorio=ARMAZEM_DIR, compacto=False):
+    """
+    colunas: lista de colunas a carregar (None para todas)
+    inicio, fim: limites inclusivos de "Data Base"
+    compacto: True para o layout de compactar_historico()
+    """
+    filtros = []
+    if inicio is not None:
+        inicio = pd.Timestamp(inicio)
+        filtros += [("ano", ">=", inicio.year), ("Data Base", ">=", inicio)]
+    if fim is not None:
+        fim = pd.Timestamp(fim)
+        filtros += [("ano", "<=", fim.year), ("Data Base", "<=", fim)]
+
+    # Uma atualização interrompida depois de confirmada é concluída antes da leitura
+    manifesto = ler_manifesto_armazem(diretorio)
+    if manifesto and manifesto.get("pendentes"):
+        _concluir_pendentes(diretorio, manifesto)
+
+    if colunas is not None and "Data Base" not in colunas:
+        colunas = list(colunas) + ["Data Base"]
+    df = pd.read_parquet(diretorio, columns=colunas, filters=filtros or None)
+    df = df.drop(columns="ano", errors="ignore").reset_index(drop=True)
+    return compactar_historico(df) if compacto else df
+
+
+# Apenas as linhas da "Data Base" mais recente
+def ler_ultima_data_base(colunas=None, diretorio=ARMAZEM_DIR):
+    ultima = ultima_data_armazem(diretorio)
+    if ultima is None:
+        return None
+    return ler_armazem(colunas, inicio=ultima, fim=ultima, diretorio=diretorio)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Atualiza o armazenamento local do histórico do Tesouro Direto.")
+    parser.add_argument("--relatorio-memoria", action="store_true",
+                        help="mostra a memória do histórico completo nos layouts padrão e compacto")
+    args = parser.parse_args()
+
+    novas = atualizar_armazem()
+    print(f"{novas} linhas acrescentadas em {ARMAZEM_DIR} (última data: {ultima_data_armazem()})")
+    if args.relatorio_memoria:
+        with pd.option_context("display.width", 200, "display.max_columns", None):
+            print(relatorio_memoria(preparar_historico(ler_armazem())).to_string(index=False))
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Durações recentes guardadas por span, para os quantis
+AMOSTRAS_POR_SPAN = 1024
+PREFIXO_PROMETHEUS = "extrator_"
+# Ativa o painel de diagnóstico sem precisar do parâmetro ?diagnostico=1 na URL
+VARIAVEL_DIAGNOSTICO = "EXTRATOR_DIAGNOSTICO"
+
+_spans = {}
+_contadores = {}
+_lock = threading.Lock()
+_local = threading.local()
+_inicio = time.time()
+
+
+class _Span:
+    __slots__ = ("chamadas", "erros", "soma", "maximo", "ultimo", "amostras")
+
+    def __init__(self):
+        self.chamadas = 0
+        self.erros = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+        self.ultimo = 0.0
+        self.amostras = deque(maxlen=AMOSTRAS_POR_SPAN)
+
+
+def _chave(nome, rotulos):
+    return nome, tuple(sorted(rotulos.items()))
+
+
+def registrar_span(nome, duracao, erro=False):
+    with _lock:
+        span = _spans.get(nome)
+        if span is None:
+            span = _spans[nome] = _Span()
+        span.chamadas += 1
+        span.erros += bool(erro)
+        span.soma += duracao
+        span.maximo = max(span.maximo, duracao)
+        span.ultimo = duracao
+        span.amostras.append(duracao)
+
+
+# Mede o bloco como um span: chamadas, erros e duração
+@contextmanager
+def medir(nome):
+    inicio = time.perf_counter()
+    erro = False
+    try:
+        yield
+    except BaseException:
+        erro = True
+        raise
+    finally:
+        registrar_span(nome, time.perf_counter() - inicio, erro)
+
+
+# Decorador equivalente a medir(nome) em volta de cada chamada
+def instrumentar(nome):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with medir(nome):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def contar(nome, valor=1, **rotulos):
+    chave = _chave(nome, rotulos)
+    with _lock:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+
+def registrar_cache(cache, acerto):
+    contar("cache", cache=cache, resultado="acerto" if acerto else "falha")
+
+
+def registrar_bytes(origem, quantidade):
+    contar("bytes_transferidos", quantidade, origem=origem)
+
+
+# Para caches que escondem a execução (como st.cache_data): a função cacheada
+# chama falha_cache(nome) e quem a chama usa "with consulta_cache(nome)"
+def falha_cache(nome):
+    falhas = getattr(_local, "falhas", None)
+    if falhas is not None:
+        falhas.add(nome)
+
+
+@contextmanager
+def consulta_cache(nome):
+    anteriores = getattr(_local, "falhas", None)
+    _local.falhas = set()
+    try:
+        with medir(nome):
+            yield
+    finally:
+        registrar_cache(nome, nome not in _local.falhas)
+        _local.falhas = anteriores
+
+
+def _quantil(ordenadas, q):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(int(q * len(ordenadas)), len(ordenadas) - 1)]
+
+
+# Cópia consistente de todas as métricas, pronta para JSON
+def instantaneo():
+    with _lock:
+        spans = {nome: (s.chamadas, s.erros, s.soma, s.maximo, s.ultimo, sorted(s.amostras)) for nome, s in _spans.items()}
+        contadores = dict(_contadores)
+    caches = {}
+    for (nome, rotulos), valor in contadores.items():
+        if nome == "cache":
+            rotulos = dict(rotulos)
+            caches.setdefault(rotulos["cache"], {"acertos": 0, "falhas": 0})[
+                "acertos" if rotulos["resultado"] == "acerto" else "falhas"] += valor
+    for c in caches.values():
+        total = c["acertos"] + c["falhas"]
+        c["taxa_acerto"] = c["acertos"] / total if total else None
+    return {
+        "coletado_em": time.time(),
+        "desde": _inicio,
+        "spans": {
+            nome: {
+                "chamadas": chamadas, "erros": erros, "soma_s": soma,
+                "media_s": soma / chamadas if chamadas else 0.0,
+                "p50_s": _quantil(amostras, 0.5), "p99_s": _quantil(amostras, 0.99),
+                "max_s": maximo, "ultimo_s": ultimo,
+            }
+            for nome, (chamadas, erros, soma, maximo, ultimo, amostras) in sorted(spans.items())
+        },
+        "caches": dict(sorted(caches.items())),
+        "contadores": [
+            {"nome": nome, "rotulos": dict(rotulos), "valor": valor}
+            for (nome, rotulos), valor in sorted(contadores.items())
+        ],
+    }
+
+
+def exportar_json(indent=2):
+    return json.dumps(instantaneo(), ensure_ascii=False, indent=indent)
+
+
+def _rotulos_prometheus(rotulos):
+    if not rotulos:
+        return ""
+    escapar = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")  # noqa: E731
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in rotulos.items()) + "}"
+
+
+# Formato de exposição em texto do Prometheus
+def exportar_prometheus(prefixo=PREFIXO_PROMETHEUS):
+    dados = instantaneo()
+    linhas = [
+        f"# HELP {prefixo}span_segundos Duração dos estágios instrumentados.",
+        f"# TYPE {prefixo}span_segundos summary",
+    ]
+    for nome, s in dados["spans"].items():
+        for q, chave in (("0.5", "p50_s"), ("0.99", "p99_s")):
+            linhas.append(f"{prefixo}span_segundos{_rotulos_prometheus({'span': nome, 'quantile': q})} {s[chave]}")
+        linhas.append(f"{prefixo}span_segundos_sum{_rotulos_prometheus({'span': nome})} {s['soma_s']}")
+        linhas.append(f"{prefixo}span_segundos_count{_rotulos_prometheus({'span': nome})} {s['chamadas']}")
+    linhas.append(f"# TYPE {prefixo}span_erros_total counter")
+    for nome, s in dados["spans"].items():
+        linhas.append(f"{prefixo}span_erros_total{_rotulos_prometheus({'span': nome})} {s['erros']}")
+
+    por_nome = {}
+    for c in dados["contadores"]:
+        por_nome.setdefault(c["nome"], []).append(c)
+    for nome, contadores in por_nome.items():
+        linhas.append(f"# TYPE {prefixo}{nome}_total counter")
+        for c in contadores:
+            linhas.append(f"{prefixo}{nome}_total{_rotulos_prometheus(c['rotulos'])} {c['valor']}")
+    return "\n".join(linhas) + "\n"
+
+
+def zerar():
+    with _lock:
+        _spans.clear()
+        _contadores.clear()
+
+
+# === Painel no Streamlit ===
+
+def diagnostico_ativo():
+    import streamlit as st
+    return bool(os.environ.get(VARIAVEL_DIAGNOSTICO)) or "diagnostico" in st.query_params
+
+
+# Painel opcional na barra lateral com spans, caches, bytes e exportação
+def painel_diagnostico(forcar=False):
+    """
+    Só aparece com ?diagnostico=1 na URL, com a variável de ambiente
+    EXTRATOR_DIAGNOSTICO definida ou com forcar=True.
+    As métricas são do processo: somam todas as sessões abertas.
+    """
+    import streamlit as st
+    import pandas as pd
+
+    if not (forcar or diagnostico_ativo()):
+        return
+    dados = instantaneo()
+    with st.sidebar.expander("🩺 Diagnóstico", expanded=False):
+        if dados["spans"]:
+            st.write("**Estágios**")
+            st.dataframe(pd.DataFrame([
+                {
+                    "Estágio": nome,
+                    "Chamadas": s["chamadas"],
+                    "Média (ms)": round(s["media_s"] * 1000, 1),
+                    "p50 (ms)": round(s["p50_s"] * 1000, 1),
+                    "p99 (ms)": round(s["p99_s"] * 1000, 1),
+                    "Último (ms)": round(s["ultimo_s"] * 1000, 1),
+                    "Erros": s["erros"],
+                }
+                for nome, s in dados["spans"].items()
+            ]), hide_index=True, use_container_width=True)
+        if dados["caches"]:
+            st.write("**Caches**")
+            st.dataframe(pd.DataFrame([
+                {
+                    "Cache": nome,
+                    "Acertos": c["acertos"],
+                    "Falhas": c["falhas"],
+                    "Taxa de acerto": f"{c['taxa_acerto']:.0%}" if c["taxa_acerto"] is not None else "",
+                }
+                for nome, c in dados["caches"].items()
+            ]), hide_index=True, use_container_width=True)
+        transferidos = [c for c in dados["contadores"] if c["nome"] == "bytes_transferidos"]
+        if transferidos:
+            st.write("**Bytes transferidos**")
+            st.dataframe(pd.DataFrame([
+                {"Origem": c["rotulos"].get("origem", ""), "MiB": round(c["valor"] / 1024 / 1024, 3)}
+                for c in transferidos
+            ]), hide_index=True, use_container_width=True)
+        col1, col2 = st.columns(2)
+        col1.download_button("JSON", exportar_json(), file_name="metricas.json", mime="application/json")
+        col2.download_button("Prometheus", exportar_prometheus(), file_name="metricas.prom", mime="text/plain")
+        if st.button("Zerar métricas"):
+            zerar()
+            st.rerun()
@@ -0,0 +1,184 @@
+from collections import namedtuple
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+from comparacao_tesouro import separar_tipo_ano
+
+DIAS_UTEIS_ANO = 252
+NOMINAL_PREFIXADO = 1000.0
+# Títulos precificáveis: tipo normalizado -> (valor nominal, cupom em % a.a.)
+# Nominal None: o VNA (IPCA+ e Selic) é calibrado pelo preço e taxa observados
+# Na Selic a taxa negociada é um spread sobre a Selic (ágio/deságio), não uma taxa cheia
+TITULOS_PRECIFICAVEIS = {
+    "tesouro prefixado": (NOMINAL_PREFIXADO, 0.0),
+    "tesouro prefixado com juros semestrais": (NOMINAL_PREFIXADO, 10.0),
+    "tesouro ipca+": (None, 0.0),
+    "tesouro ipca+ com juros semestrais": (None, 6.0),
+    "tesouro selic": (None, 0.0),
+}
+# Limite de elementos (títulos x cenários x fluxos) calculados de uma vez
+_ELEMENTOS_BLOCO = 4_000_000
+
+Fluxos = namedtuple("Fluxos", ["prazos", "valores", "nominal"])
+Sensibilidades = namedtuple("Sensibilidades", ["pu", "duration", "duration_modificada", "convexidade"])
+
+
+def _pascoa(ano):
+    a, b, c = ano % 19, ano // 100, ano % 100
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    mes = (h + l - 7 * m + 90) // 25
+    return date(ano, mes, (h + l - 7 * m + 33 * mes + 19) % 32)
+
+
+# Feriados nacionais usados na contagem de dias úteis dos títulos públicos
+def feriados_nacionais(ano_inicio, ano_fim):
+    feriados = []
+    for ano in range(ano_inicio, ano_fim + 1):
+        fixos = [(1, 1), (4, 21), (5, 1), (9, 7), (10, 12), (11, 2), (11, 15), (12, 25)]
+        if ano >= 2024:
+            fixos.append((11, 20))
+        pascoa = _pascoa(ano)
+        feriados += [date(ano, mes, dia) for mes, dia in fixos]
+        # Carnaval (segunda e terça), Sexta-feira Santa e Corpus Christi
+        feriados += [pascoa + timedelta(days=d) for d in (-48, -47, -2, 60)]
+    return np.array(sorted(set(feriados)), dtype="datetime64[D]")
+
+
+# Calendário pré-calculado uma única vez; cobre todos os vencimentos negociados
+CALENDARIO = np.busdaycalendar(holidays=feriados_nacionais(2000, 2080))
+
+
+# Dias úteis entre datas (vetorizado), no calendário de feriados nacionais
+def dias_uteis(inicio, fim, calendario=CALENDARIO):
+    inicio = np.asarray(inicio, dtype="datetime64[D]")
+    fim = np.asarray(fim, dtype="datetime64[D]")
+    return np.busday_count(inicio, fim, busdaycal=calendario)
+
+
+# Fluxos de caixa de todos os títulos, como matrizes (títulos x fluxos) preenchidas com zero
+def montar_fluxos(titulos, vencimentos, data_base=None):
+    """
+    titulos: nomes como na API (ex.: "Tesouro IPCA+ com Juros Semestrais 2035")
+    vencimentos: datas de vencimento alinhadas a titulos
+    data_base: data de liquidação (None para hoje)
+    Cupons semestrais são pagos a cada 6 meses contados para trás do vencimento.
+    prazos estão em anos (dias úteis / 252) e valores por unidade de nominal.
+    Títulos fora de TITULOS_PRECIFICAVEIS ou vencidos ficam com nominal NaN.
+    """
+    titulos = pd.Series(list(titulos), dtype="object")
+    data_base = np.datetime64(pd.Timestamp(data_base or pd.Timestamp.today()).normalize().date(), "D")
+    vencimentos = pd.to_datetime(pd.Series(list(vencimentos))).to_numpy().astype("datetime64[D]")
+
+    tipos = separar_tipo_ano(titulos)["tipo"].fillna("")
+    suportado = tipos.isin(list(TITULOS_PRECIFICAVEIS)).to_numpy()
+    parametros = [TITULOS_PRECIFICAVEIS.get(tipo, (np.nan, 0.0)) for tipo in tipos]
+    nominal = np.array([np.nan if n is None else n for n, _ in parametros], dtype="float64")
+    cupom = np.array([c for _, c in parametros], dtype="float64")
+    cupom = (1 + cupom / 100) ** 0.5 - 1
+
+    # Datas de pagamento: vencimento - 6k meses, mantendo o dia do vencimento
+    mes_vencimento = vencimentos.astype("datetime64[M]")
+    dia = vencimentos - mes_vencimento.astype("datetime64[D]")
+    semestres = (mes_vencimento - data_base.astype("datetime64[M]")).astype("int64") // 6 + 1
+    k = int(max(1, np.max(np.where(cupom > 0, semestres, 1), initial=1)))
+    passos = np.arange(k) * 6
+    datas = (mes_vencimento[:, None] - passos[None, :]).astype("datetime64[D]") + dia[:, None]
+    validos = (datas > data_base) & ((passos[None, :] == 0) | (cupom[:, None] > 0)) & suportado[:, None]
+
+    prazos = np.where(validos, dias_uteis(data_base, datas) / DIAS_UTEIS_ANO, 0.0)
+    valores = np.where(validos, cupom[:, None], 0.0)
+    valores[:, 0] += np.where(validos[:, 0], 1.0, 0.0)
+    nominal[~validos[:, 0]] = np.nan
+    return Fluxos(prazos, valores, nominal)
+
+
+# Taxas em % a.a. como grade (títulos x cenários)
+def _grade(taxas, n):
+    taxas = np.asarray(taxas, dtype="float64") / 100
+    if taxas.ndim == 0:
+        taxas = taxas.reshape(1)
+    if taxas.ndim == 1:
+        taxas = np.broadcast_to(taxas, (n, len(taxas)))
+    return taxas
+
+
+# Valor presente de cada fluxo, em blocos de cenários para limitar a memória
+def _blocos(fluxos, taxas):
+    n, k = fluxos.prazos.shape
+    taxas = _grade(taxas, n)
+    passo = max(1, _ELEMENTOS_BLOCO // max(1, n * k))
+    for inicio in range(0, taxas.shape[1], passo):
+        bloco = taxas[:, inicio:inicio + passo]
+        desconto = (1 + bloco[:, :, None]) ** -fluxos.prazos[:, None, :]
+        yield slice(inicio, inicio + bloco.shape[1]), bloco, fluxos.valores[:, None, :] * desconto
+
+
+# PU de todos os títulos em todos os cenários de taxa
+def precificar(fluxos, taxas):
+    """
+    taxas: % a.a.; um array (cenários,) aplicado a todos os títulos ou (títulos, cenários)
+    Retorna um array (títulos, cenários).
+    """
+    pu = np.empty(_grade(taxas, len(fluxos.nominal)).shape)
+    for colunas, _, presentes in _blocos(fluxos, taxas):
+        pu[:, colunas] = presentes.sum(axis=-1)
+    return pu * fluxos.nominal[:, None]
+
+
+# PU, duration (Macaulay, em anos), duration modificada e convexidade na mesma passada
+def sensibilidades(fluxos, taxas):
+    forma = _grade(taxas, len(fluxos.nominal)).shape
+    pu, duration, modificada, convexidade = (np.empty(forma) for _ in range(4))
+    prazos = fluxos.prazos[:, None, :]
+    for colunas, bloco, presentes in _blocos(fluxos, taxas):
+        soma = presentes.sum(axis=-1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            duration[:, colunas] = (presentes * prazos).sum(axis=-1) / soma
+            convexidade[:, colunas] = (presentes * prazos * (prazos + 1)).sum(axis=-1) / (soma * (1 + bloco) ** 2)
+        modificada[:, colunas] = duration[:, colunas] / (1 + bloco)
+        pu[:, colunas] = soma
+    pu *= fluxos.nominal[:, None]
+    return Sensibilidades(pu, duration, modificada, convexidade)
+
+
+# VNA implícito (IPCA+ e Selic): o nominal que reproduz o preço observado à taxa observada
+def calibrar_nominal(fluxos, precos, taxas):
+    precos = np.asarray(precos, dtype="float64")
+    unitario = precificar(fluxos._replace(nominal=np.ones(len(precos))), np.asarray(taxas, dtype="float64")[:, None])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        implicito = np.where((precos > 0) & (unitario[:, 0] > 0), precos / unitario[:, 0], np.nan)
+    return np.where(np.isnan(fluxos.nominal), implicito, fluxos.nominal)
+
+
+# Fluxos da tabela de títulos da API, com o VNA calibrado pelo preço e taxa atuais
+def fluxos_da_tabela(titulos, data_base=None, coluna_taxa="Rentabilidade (Compra)", coluna_preco="Preço R$ (Compra)"):
+    """
+    titulos: DataFrame com "Título", "Vencimento", coluna_taxa e coluna_preco
+             (ex.: api_tesouro.tabela_titulos)
+    """
+    fluxos = montar_fluxos(titulos["Título"], titulos["Vencimento"], data_base)
+    # Sem PU de referência (título fora de oferta), o VNA fica desconhecido
+    return fluxos._replace(nominal=calibrar_nominal(fluxos, titulos[coluna_preco], titulos[coluna_taxa]))
+
+
+# "Quanto custaria cada título a estas taxas": tabela (títulos x cenários) de PU
+def precificar_titulos(titulos, taxas, data_base=None, coluna_taxa="Rentabilidade (Compra)",
+                       coluna_preco="Preço R$ (Compra)"):
+    """
+    taxas: cenários em % a.a. (o mesmo para todos os títulos) ou (títulos, cenários)
+    Retorna um DataFrame com o índice de titulos e uma coluna por cenário.
+    Para a Tesouro Selic as taxas são spreads sobre a Selic, na mesma unidade da
+    "Rentabilidade (Compra)" da API (ex.: 0.10): passar a Selic cheia (ex.: 14.0)
+    desconta o VNA como se fosse um prefixado. Por isso o app não mostra o preço na
+    taxa de referência para a Selic, cuja referência é a taxa cheia.
+    """
+    fluxos = fluxos_da_tabela(titulos, data_base, coluna_taxa, coluna_preco)
+    pu = precificar(fluxos, taxas)
+    colunas = np.asarray(taxas).reshape(-1) if np.ndim(taxas) <= 1 else range(pu.shape[1])
+    return pd.DataFrame(pu, index=titulos.index, columns=colunas)
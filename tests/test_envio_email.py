@@ -0,0 +1,14 @@
+import io
+import base64
+
+import pytest
+
+import envio_email
+
+
+# Mesmo resultado do base64 de uma vez, inclusive nas bordas dos blocos de 57 bytes
+@pytest.mark.parametrize("tamanho", [0, 1, 57, 58, envio_email.BLOCO_BASE64, envio_email.BLOCO_BASE64 * 2 + 5])
+def test_base64_em_blocos_igual_ao_base64_direto(tamanho):
+    dados = bytes(range(256)) * (tamanho // 256 + 1)
+    dados = dados[:tamanho]
+    assert envio_email._base64_em_blocos(io.BytesIO(dados)) == base64.encodebytes(dados).decode("ascii")
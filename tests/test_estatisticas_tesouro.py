@@ -0,0 +1,17 @@
+import pandas as pd
+
+import estatisticas_tesouro as estatisticas
+
+
+def test_resumo_deixa_de_fora_titulos_vencidos():
+    df = pd.DataFrame({
+        "Tipo Titulo": ["Tesouro IPCA+"] * 2 + ["Tesouro Prefixado"] * 2,
+        "Data Vencimento": pd.to_datetime(["2035-05-15"] * 2 + ["2020-01-01"] * 2),
+        "Data Base": pd.to_datetime(["2024-01-02", "2024-01-03", "2019-12-30", "2019-12-31"]),
+        "Taxa Compra Manha": [6.0] * 4, "Taxa Venda Manha": [6.1] * 4,
+        "PU Compra Manha": [1000.0] * 4, "PU Venda Manha": [990.0] * 4,
+        "PU Base Manha": [995.0, 996.0, 990.0, 999.0],
+    })
+    resumo = estatisticas.resumir_estatisticas(estatisticas.calcular_estatisticas(df))
+    assert resumo["Título"].tolist() == ["Tesouro IPCA+ 2035"]
+    assert (resumo["Data Base"] == pd.Timestamp("2024-01-03")).all()
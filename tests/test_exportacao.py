@@ -0,0 +1,36 @@
+import os
+import json
+
+import pytest
+
+import exportacao
+from exportacao import exportar_csv
+
+
+# Falha ao gravar o CSV de origem não pode deixar o arquivo truncado nem o hash novo
+def test_falha_na_gravacao_mantem_fonte_e_hash_anteriores(tmp_path, monkeypatch):
+    caminho = str(tmp_path / "neto.csv")
+    v1 = b"Ticker,Neto\nPETR4,10\n"
+    v2 = b"Ticker,Neto\nPETR4,12\n"
+    assert exportar_csv(v1, caminho).alterado
+
+    gravar = exportacao._gravar_bytes
+
+    def falhar_no_meio(dados, destino):
+        if destino.endswith(".fonte.csv"):
+            with open(os.path.join(os.path.dirname(destino), ".tmp-" + os.path.basename(destino)), "wb") as f:
+                f.write(dados[:5])
+            raise OSError("disco cheio")
+        gravar(dados, destino)
+
+    monkeypatch.setattr(exportacao, "_gravar_bytes", falhar_no_meio)
+    with pytest.raises(OSError):
+        exportar_csv(v2, caminho)
+    assert open(caminho + ".fonte.csv", "rb").read() == v1
+    assert json.load(open(caminho + ".fonte.json"))["linhas"] == 1
+
+    monkeypatch.setattr(exportacao, "_gravar_bytes", gravar)
+    resultado = exportar_csv(v2, caminho)
+    assert resultado.alterado
+    assert list(resultado.diferencas["Depois"]) == [12]
+    assert open(caminho + ".fonte.csv", "rb").read() == v2
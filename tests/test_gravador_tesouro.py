@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+import gravador_tesouro as gravador
+
+
+def _snapshot(taxas):
+    return {"response": {
+        "TrsrBondMkt": {"sts": "Aberto", "opngDtTm": None, "clsgDtTm": None},
+        "TrsrBdTradgList": [
+            {"TrsrBd": {"nm": nome, "mtrtyDt": "2035-05-15T00:00:00", "FinIndxs": {"nm": "IPCA"},
+                        "anulInvstmtRate": taxa, "untrInvstmtVal": 1000.0, "anulRedRate": taxa, "untrRedVal": 990.0}}
+            for nome, taxa in taxas.items()
+        ],
+    }}
+
+
+# Conexão cuja próxima gravação em precos falha como um banco travado por outro processo
+class _ConexaoTravada(sqlite3.Connection):
+    falhar = False
+
+    def executemany(self, sql, parametros):
+        if self.falhar:
+            raise sqlite3.OperationalError("database is locked")
+        return super().executemany(sql, parametros)
+
+
+def _taxas_gravadas(caminho):
+    snapshot = gravador.ler_ultimo_snapshot(caminho, somente_valido=False)
+    return {item["TrsrBd"]["nm"]: item["TrsrBd"]["anulInvstmtRate"] for item in snapshot["response"]["TrsrBdTradgList"]}
+
+
+def test_gravacao_que_falha_e_refeita_na_captura_seguinte(tmp_path):
+    caminho = str(tmp_path / "intradiario.sqlite")
+    gravador.abrir_banco(caminho).close()
+    conn = sqlite3.connect(caminho, factory=_ConexaoTravada)
+    ultimos = gravador._ultimos_precos(conn)
+    gravador.gravar_snapshot(conn, _snapshot({"Tesouro IPCA+ 2035": 6.0, "Tesouro IPCA+ 2045": 6.1}), ultimos=ultimos)
+
+    conn.falhar = True
+    with pytest.raises(sqlite3.OperationalError):
+        gravador.gravar_snapshot(conn, _snapshot({"Tesouro IPCA+ 2035": 6.5}), ultimos=ultimos)
+    assert ultimos == gravador._ultimos_precos(conn)
+
+    conn.falhar = False
+    alterados = gravador.gravar_snapshot(conn, _snapshot({"Tesouro IPCA+ 2035": 6.5}), ultimos=ultimos)
+    conn.close()
+    # A mudança de taxa e a saída do 2045 são gravadas na nova tentativa
+    assert alterados == 2
+    assert _taxas_gravadas(caminho) == {"Tesouro IPCA+ 2035": 6.5}
+
+
+def test_titulo_removido_some_do_snapshot_e_da_serie(tmp_path):
+    caminho = str(tmp_path / "intradiario.sqlite")
+    conn = gravador.abrir_banco(caminho)
+    ultimos = gravador._ultimos_precos(conn)
+    gravador.gravar_snapshot(conn, _snapshot({"Tesouro IPCA+ 2035": 6.0, "Tesouro IPCA+ 2045": 6.1}), ultimos=ultimos)
+    gravador.gravar_snapshot(conn, _snapshot({"Tesouro IPCA+ 2035": 6.2}), ultimos=ultimos)
+    conn.close()
+
+    assert _taxas_gravadas(caminho) == {"Tesouro IPCA+ 2035": 6.2}
+    serie = gravador.serie_intradiaria(caminho)
+    assert serie.groupby("Título").size().to_dict() == {"Tesouro IPCA+ 2035": 2, "Tesouro IPCA+ 2045": 1}
@@ -0,0 +1,73 @@
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+import historico_tesouro as historico
+
+
+class _Queda(Exception):
+    pass
+
+
+def _csv(tmp_path, datas):
+    linhas = ["Tipo Titulo;Data Vencimento;Data Base;Taxa Compra Manha;Taxa Venda Manha;"
+              "PU Compra Manha;PU Venda Manha;PU Base Manha"]
+    for data in datas:
+        for tipo in ("Tesouro Selic", "Tesouro IPCA+"):
+            linhas.append(f"{tipo};01/01/2035;{data:%d/%m/%Y};6,33;6,43;9733,37;9636,04;9684,71")
+    caminho = tmp_path / "PrecoTaxaTesouroDireto.csv"
+    caminho.write_text("\n".join(linhas) + "\n", encoding="latin-1")
+    return str(caminho)
+
+
+def _pendentes(diretorio):
+    return glob.glob(os.path.join(diretorio, "ano=*", ".*" + historico.SUFIXO_PENDENTE))
+
+
+@pytest.fixture
+def fonte(tmp_path):
+    return _csv(tmp_path, pd.bdate_range("2023-12-20", "2024-01-10"))
+
+
+def test_queda_antes_do_manifesto_descarta_as_partes(tmp_path, fonte, monkeypatch):
+    diretorio = str(tmp_path / "armazem")
+    gravar = historico._gravar_manifesto
+
+    def cair(*args):
+        raise _Queda()
+
+    monkeypatch.setattr(historico, "_gravar_manifesto", cair)
+    with pytest.raises(_Queda):
+        historico.atualizar_armazem(fonte, diretorio)
+    assert len(_pendentes(diretorio)) == 2
+
+    # A fonte seguinte ainda não tem 2024: a parte órfã desse ano não é regravada
+    monkeypatch.setattr(historico, "_gravar_manifesto", gravar)
+    fonte = _csv(tmp_path, pd.bdate_range("2023-12-20", "2023-12-29"))
+    assert historico.atualizar_armazem(fonte, diretorio) == 16
+    assert _pendentes(diretorio) == []
+    df = historico.ler_armazem(diretorio=diretorio)
+    assert len(df) == 16 and not df.duplicated().any()
+
+
+def test_queda_depois_do_manifesto_conclui_as_partes(tmp_path, fonte, monkeypatch):
+    diretorio = str(tmp_path / "armazem")
+    concluir = historico._concluir_pendentes
+
+    def cair(diretorio, manifesto):
+        if manifesto.get("pendentes"):
+            raise _Queda()
+        concluir(diretorio, manifesto)
+
+    monkeypatch.setattr(historico, "_concluir_pendentes", cair)
+    with pytest.raises(_Queda):
+        historico.atualizar_armazem(fonte, diretorio)
+    assert len(_pendentes(diretorio)) == 2
+
+    monkeypatch.setattr(historico, "_concluir_pendentes", concluir)
+    df = historico.ler_armazem(diretorio=diretorio)
+    assert len(df) == 32 and not df.duplicated().any()
+    assert _pendentes(diretorio) == []
+    assert historico.atualizar_armazem(fonte, diretorio) == 0
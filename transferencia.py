@@ -0,0 +1,135 @@
+import os
+import json
+import time
+from collections import namedtuple
+
+from metricas import registrar_cache, registrar_bytes
+from transporte import obter_sessao
+
+# Tempo limite padrão: (conexão, leitura entre blocos), em segundos
+TIMEOUT_PADRAO = (10, 60)
+TAMANHO_BLOCO = 1024 * 1024
+
+ResultadoDownload = namedtuple("ResultadoDownload", ["caminho", "modificado", "bytes_transferidos", "retomado"])
+
+
+def _caminho_meta(caminho):
+    return caminho + ".meta.json"
+
+
+def ler_meta(caminho):
+    try:
+        with open(_caminho_meta(caminho), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _gravar_meta(caminho, meta):
+    destino = _caminho_meta(caminho)
+    temporario = destino + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, destino)
+
+
+def _validadores(resposta):
+    return {
+        "etag": resposta.headers.get("ETag"),
+        "last_modified": resposta.headers.get("Last-Modified"),
+    }
+
+
+# Blocos do corpo de uma resposta com stream=True; com prazo, cada bloco é entregue assim
+# que chega (sem esperar completar tamanho_bloco), para que o prazo seja conferido mesmo
+# numa transferência lenta; o timeout do requests limita só cada leitura no socket
+def ler_blocos(resposta, tamanho_bloco=TAMANHO_BLOCO, prazo=None):
+    ler = getattr(resposta.raw, "read1", None)
+    if prazo is None or ler is None:
+        yield from resposta.iter_content(chunk_size=tamanho_bloco)
+        return
+    while True:
+        if time.monotonic() > prazo:
+            raise TimeoutError(f"Transferência de {resposta.url} passou do prazo")
+        bloco = ler(tamanho_bloco, decode_content=True)
+        if not bloco:
+            return
+        yield bloco
+
+
+# Baixa url para caminho em blocos, de forma condicional e retomável
+def baixar_arquivo(url, caminho, timeout=TIMEOUT_PADRAO, tamanho_bloco=TAMANHO_BLOCO, sessao=None, verificar_ssl=True,
+                   prazo=None):
+    """
+    - Envia If-None-Match / If-Modified-Since com os validadores do último
+      download (guardados em <caminho>.meta.json) e não transfere nada em 304.
+    - Grava em <caminho>.part e só renomeia para caminho ao final (os.replace).
+    - Se existir um .part de uma tentativa interrompida, pede apenas o restante
+      com Range + If-Range.
+    - prazo: instante (time.monotonic()) limite para a transferência inteira (ver
+      ler_blocos). Estourado, gera TimeoutError e o .part fica para ser retomado.
+    Retorna um ResultadoDownload; erros HTTP e de rede são propagados.
+    """
+    sessao = sessao or obter_sessao()
+    meta = ler_meta(caminho)
+    parcial = caminho + ".part"
+
+    # Sem compressão de transporte, para que os offsets do Range batam com o .part
+    headers = {"Accept-Encoding": "identity"}
+    if os.path.exists(caminho) and meta.get("url") == url:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    inicio = 0
+    info_parcial = meta.get("parcial") or {}
+    if os.path.exists(parcial) and info_parcial.get("url") == url:
+        # ETag fraca não pode ser usada em If-Range
+        validador = info_parcial.get("etag")
+        if not validador or validador.startswith("W/"):
+            validador = info_parcial.get("last_modified")
+        if validador:
+            inicio = os.path.getsize(parcial)
+            if inicio > 0:
+                headers["Range"] = f"bytes={inicio}-"
+                headers["If-Range"] = validador
+
+    with sessao.get(url, headers=headers, stream=True, timeout=timeout, verify=verificar_ssl) as resposta:
+        if resposta.status_code == 304:
+            if os.path.exists(parcial):
+                os.remove(parcial)
+            meta.pop("parcial", None)
+            _gravar_meta(caminho, meta)
+            registrar_cache("download_condicional", True)
+            return ResultadoDownload(caminho, False, 0, False)
+
+        # 206 só é aceito se continuar exatamente do fim do .part; caso contrário
+        # (ou em 416) o .part é descartado e o download recomeça do zero
+        retomado = resposta.status_code == 206
+        if inicio and (resposta.status_code == 416 or (
+                retomado and not resposta.headers.get("Content-Range", "").startswith(f"bytes {inicio}-"))):
+            resposta.close()
+            os.remove(parcial)
+            return baixar_arquivo(url, caminho, timeout, tamanho_bloco, sessao, verificar_ssl, prazo)
+        resposta.raise_for_status()
+        if not retomado:
+            inicio = 0
+
+        # Guarda os validadores antes de transferir, para permitir retomar depois
+        validadores = _validadores(resposta)
+        meta["parcial"] = dict(validadores, url=url)
+        _gravar_meta(caminho, meta)
+
+        transferidos = 0
+        with open(parcial, "ab" if retomado else "wb") as arquivo:
+            for bloco in ler_blocos(resposta, tamanho_bloco, prazo):
+                arquivo.write(bloco)
+                transferidos += len(bloco)
+
+    os.replace(parcial, caminho)
+    meta = dict(validadores, url=url, tamanho=inicio + transferidos)
+    _gravar_meta(caminho, meta)
+    registrar_cache("download_condicional", False)
+    registrar_bytes(os.path.basename(caminho), transferidos)
+    return ResultadoDownload(caminho, True, transferidos, retomado)
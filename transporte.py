@@ -0,0 +1,311 @@
+"""
+Camada HTTP com gravação e reprodução de respostas.
+
+Todo acesso HTTP do projeto passa por obter_sessao(). O modo é escolhido por
+variáveis de ambiente (ou por configurar()):
+
+    EXTRATOR_HTTP_MODO        real (padrão), gravar, reproduzir ou stub
+    EXTRATOR_HTTP_GRAVACOES   pasta das gravações (padrão: dados/gravacoes_http)
+    EXTRATOR_HTTP_LATENCIA    atraso, em segundos, de cada resposta reproduzida
+    EXTRATOR_HTTP_STUB        no modo stub, endereço do servidor local (ex.: http://127.0.0.1:8765)
+
+Uso pela linha de comando:
+    python transporte.py gravar URL [URL ...] [--sem-verificar-ssl]
+    python transporte.py servir [--porta 8765] [--latencia 0.2]
+"""
+import io
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+import http.server
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+MODOS = ("real", "gravar", "reproduzir", "stub")
+GRAVACOES_DIR = os.path.normpath(os.path.join("dados", "gravacoes_http"))
+# Cabeçalho com a URL original, enviado ao servidor stub no lugar do host real
+CABECALHO_URL_ORIGINAL = "X-Extrator-Url-Original"
+# Cabeçalhos que não valem para o corpo já decodificado guardado na gravação
+_CABECALHOS_DESCARTADOS = {"content-encoding", "transfer-encoding", "content-length", "connection", "keep-alive"}
+
+_config = {
+    "modo": os.environ.get("EXTRATOR_HTTP_MODO", "real"),
+    "diretorio": os.environ.get("EXTRATOR_HTTP_GRAVACOES", GRAVACOES_DIR),
+    "latencia": float(os.environ.get("EXTRATOR_HTTP_LATENCIA", "0") or 0),
+    "stub": os.environ.get("EXTRATOR_HTTP_STUB"),
+}
+_sessao = None
+_sessao_lock = threading.Lock()
+
+
+# === Gravações ===
+
+def _chave(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:24]
+
+
+def _caminho_gravacao(diretorio, url):
+    return os.path.join(diretorio, _chave(url))
+
+
+def gravar_resposta(diretorio, url, status, cabecalhos, corpo):
+    os.makedirs(diretorio, exist_ok=True)
+    base = _caminho_gravacao(diretorio, url)
+    cabecalhos = {k: v for k, v in cabecalhos.items() if k.lower() not in _CABECALHOS_DESCARTADOS}
+    with open(base + ".corpo.tmp", "wb") as f:
+        f.write(corpo)
+    os.replace(base + ".corpo.tmp", base + ".corpo")
+    with open(base + ".json.tmp", "w", encoding="utf-8") as f:
+        json.dump({
+            "url": url,
+            "status": status,
+            "cabecalhos": cabecalhos,
+            "tamanho": len(corpo),
+            "gravado_em": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(base + ".json.tmp", base + ".json")
+
+
+def ler_gravacao(diretorio, url):
+    base = _caminho_gravacao(diretorio, url)
+    try:
+        with open(base + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(base + ".corpo", "rb") as f:
+            return meta, f.read()
+    except FileNotFoundError:
+        return None
+
+
+def listar_gravacoes(diretorio):
+    if not os.path.isdir(diretorio):
+        return []
+    gravacoes = []
+    for nome in sorted(os.listdir(diretorio)):
+        if nome.endswith(".json"):
+            with open(os.path.join(diretorio, nome), "r", encoding="utf-8") as f:
+                gravacoes.append(json.load(f))
+    return gravacoes
+
+
+# Responde como o servidor original: 304 para validadores iguais, 206/416 para Range
+def responder(meta, corpo, pedido):
+    """
+    meta, corpo: gravação (ver ler_gravacao)
+    pedido: cabeçalhos da requisição
+    Retorna (status, cabeçalhos, corpo).
+    """
+    pedido = {k.lower(): v for k, v in pedido.items()}
+    cabecalhos = dict(meta["cabecalhos"])
+    gravados = {k.lower(): v for k, v in cabecalhos.items()}
+    etag, modificado = gravados.get("etag"), gravados.get("last-modified")
+
+    if (etag and pedido.get("if-none-match") == etag) or (
+            modificado and "if-none-match" not in pedido and pedido.get("if-modified-since") == modificado):
+        return 304, cabecalhos, b""
+
+    intervalo = pedido.get("range", "")
+    if_range = pedido.get("if-range")
+    if intervalo.startswith("bytes=") and intervalo.endswith("-") and (if_range is None or if_range in (etag, modificado)):
+        inicio = int(intervalo[len("bytes="):-1])
+        if inicio >= len(corpo):
+            cabecalhos["Content-Range"] = f"bytes */{len(corpo)}"
+            return 416, cabecalhos, b""
+        cabecalhos["Content-Range"] = f"bytes {inicio}-{len(corpo) - 1}/{len(corpo)}"
+        return 206, cabecalhos, corpo[inicio:]
+    return meta["status"], cabecalhos, corpo
+
+
+# === Adaptadores do requests ===
+
+def _montar_resposta(adaptador, request, status, cabecalhos, corpo):
+    cabecalhos = dict(cabecalhos, **{"Content-Length": str(len(corpo))})
+    bruta = urllib3.HTTPResponse(
+        body=io.BytesIO(corpo), headers=cabecalhos, status=status,
+        preload_content=False, decode_content=False, request_url=request.url,
+    )
+    return adaptador.build_response(request, bruta)
+
+
+# Faz a requisição real e guarda as respostas 200 completas
+class AdaptadorGravacao(HTTPAdapter):
+    def __init__(self, diretorio, **kwargs):
+        super().__init__(**kwargs)
+        self.diretorio = diretorio
+
+    def send(self, request, **kwargs):
+        resposta = super().send(request, **kwargs)
+        if request.method != "GET" or resposta.status_code != 200:
+            return resposta
+        corpo = resposta.content
+        gravar_resposta(self.diretorio, request.url, 200, dict(resposta.headers), corpo)
+        return _montar_resposta(self, request, 200, resposta.headers, corpo)
+
+
+# Serve as respostas gravadas, sem rede, com a latência configurada
+class AdaptadorReproducao(HTTPAdapter):
+    def __init__(self, diretorio, latencia=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.diretorio = diretorio
+        self.latencia = latencia
+
+    def send(self, request, **kwargs):
+        gravacao = ler_gravacao(self.diretorio, request.url)
+        if gravacao is None:
+            raise requests.ConnectionError(f"Sem gravação para {request.url}", request=request)
+        if self.latencia:
+            time.sleep(self.latencia)
+        return _montar_resposta(self, request, *responder(*gravacao, request.headers))
+
+
+# Redireciona toda requisição para o servidor stub, informando a URL original
+class AdaptadorStub(HTTPAdapter):
+    def __init__(self, base, **kwargs):
+        super().__init__(**kwargs)
+        self.base = base.rstrip("/")
+
+    def send(self, request, **kwargs):
+        original = request.url
+        partes = urlsplit(original)
+        request = request.copy()
+        request.url = self.base + (partes.path or "/") + (f"?{partes.query}" if partes.query else "")
+        request.headers[CABECALHO_URL_ORIGINAL] = original
+        resposta = super().send(request, **kwargs)
+        resposta.url = original
+        return resposta
+
+
+# === Sessão compartilhada ===
+
+def configurar(modo=None, diretorio=None, latencia=None, stub=None):
+    global _sessao
+    if modo is not None and modo not in MODOS:
+        raise ValueError(f"Modo HTTP desconhecido: {modo}")
+    with _sessao_lock:
+        for chave, valor in (("modo", modo), ("diretorio", diretorio), ("latencia", latencia), ("stub", stub)):
+            if valor is not None:
+                _config[chave] = valor
+        _sessao = None
+    return dict(_config)
+
+
+def _criar_sessao():
+    modo = _config["modo"]
+    if modo == "real":
+        return requests
+    if modo == "gravar":
+        adaptador = AdaptadorGravacao(_config["diretorio"])
+    elif modo == "reproduzir":
+        adaptador = AdaptadorReproducao(_config["diretorio"], _config["latencia"])
+    elif modo == "stub":
+        if not _config["stub"]:
+            raise ValueError("Modo stub exige EXTRATOR_HTTP_STUB com o endereço do servidor")
+        adaptador = AdaptadorStub(_config["stub"])
+    else:
+        raise ValueError(f"Modo HTTP desconhecido: {modo}")
+    sessao = requests.Session()
+    sessao.mount("http://", adaptador)
+    sessao.mount("https://", adaptador)
+    return sessao
+
+
+# Objeto com .get() usado por todo acesso HTTP: o módulo requests no modo real
+def obter_sessao():
+    global _sessao
+    with _sessao_lock:
+        if _sessao is None:
+            _sessao = _criar_sessao()
+        return _sessao
+
+
+# === Servidor stub ===
+
+class _ManipuladorStub(http.server.BaseHTTPRequestHandler):
+    diretorio = GRAVACOES_DIR
+    latencia = 0.0
+    por_caminho = {}
+
+    def do_GET(self):
+        url = self.headers.get(CABECALHO_URL_ORIGINAL)
+        gravacao = ler_gravacao(self.diretorio, url) if url else None
+        if gravacao is None:
+            url = self.por_caminho.get(self.path)
+            gravacao = ler_gravacao(self.diretorio, url) if url else None
+        if self.latencia:
+            time.sleep(self.latencia)
+        if gravacao is None:
+            self.send_error(404, "Sem gravação")
+            return
+        status, cabecalhos, corpo = responder(*gravacao, dict(self.headers))
+        self.send_response(status)
+        for nome, valor in cabecalhos.items():
+            self.send_header(nome, valor)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+# Servidor HTTP local que serve as gravações com latência; roda em uma thread
+def iniciar_stub(diretorio=None, porta=0, latencia=0.0, host="127.0.0.1"):
+    """
+    Retorna (servidor, endereço). As URLs gravadas são encontradas pelo
+    cabeçalho de URL original (ver AdaptadorStub) ou pelo caminho + query.
+    Encerre com servidor.shutdown().
+    """
+    diretorio = diretorio or _config["diretorio"]
+    por_caminho = {}
+    for meta in listar_gravacoes(diretorio):
+        partes = urlsplit(meta["url"])
+        por_caminho[(partes.path or "/") + (f"?{partes.query}" if partes.query else "")] = meta["url"]
+    manipulador = type("ManipuladorStub", (_ManipuladorStub,), {
+        "diretorio": diretorio, "latencia": latencia, "por_caminho": por_caminho,
+    })
+    servidor = http.server.ThreadingHTTPServer((host, porta), manipulador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="stub-http").start()
+    return servidor, f"http://{host}:{servidor.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--diretorio", default=_config["diretorio"], help="pasta das gravações")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    gravar = comandos.add_parser("gravar", help="grava as respostas das URLs")
+    gravar.add_argument("urls", nargs="+")
+    gravar.add_argument("--sem-verificar-ssl", action="store_true")
+    servir = comandos.add_parser("servir", help="serve as gravações em um servidor local")
+    servir.add_argument("--porta", type=int, default=8765)
+    servir.add_argument("--latencia", type=float, default=0.0, help="segundos por resposta")
+    comandos.add_parser("listar", help="lista as gravações")
+    args = parser.parse_args()
+
+    if args.comando == "gravar":
+        configurar(modo="gravar", diretorio=args.diretorio)
+        for url in args.urls:
+            resposta = obter_sessao().get(url, timeout=120, verify=not args.sem_verificar_ssl)
+            print(f"{resposta.status_code} {len(resposta.content):>12} bytes  {url}")
+    elif args.comando == "servir":
+        servidor, endereco = iniciar_stub(args.diretorio, args.porta, args.latencia)
+        print(f"Servindo {args.diretorio} em {endereco} (use EXTRATOR_HTTP_MODO=stub EXTRATOR_HTTP_STUB={endereco})")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            servidor.shutdown()
+    else:
+        for meta in listar_gravacoes(args.diretorio):
+            print(f"{meta['status']} {meta['tamanho']:>12} bytes  {meta['gravado_em']}  {meta['url']}")
+
+
+if __name__ == "__main__":
+    main()